@@ -0,0 +1,141 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '2048'))
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', '3600'))
+# Cosine similarity above which a paraphrased question reuses an answer; 0 disables the tier
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', '0.92'))
+
+
+def normalize_question(question):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    question = re.sub(r'[^\w\s]', ' ', question.lower())
+    return re.sub(r'\s+', ' ', question).strip()
+
+
+class _Entry:
+    __slots__ = ('answer', 'vector', 'expires')
+
+    def __init__(self, answer, vector, expires):
+        self.answer = answer
+        self.vector = vector
+        self.expires = expires
+
+
+class AnswerCache:
+    """TTL + LRU cache of answers keyed by scope (document id) and normalized question.
+
+    The exact tier matches normalized question text. The optional semantic
+    tier embeds the question and reuses the closest cached answer for the same
+    scope when the cosine similarity is above ``similarity_threshold``.
+    """
+
+    def __init__(self, embed_query=None, max_entries=ANSWER_CACHE_SIZE, ttl_seconds=ANSWER_CACHE_TTL,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY):
+        self.embed_query = embed_query
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def semantic_enabled(self):
+        return self.embed_query is not None and self.similarity_threshold > 0
+
+    def _embed(self, question, vector=None):
+        """Unit-length question embedding; a vector computed elsewhere is only normalized"""
+        import numpy as np
+
+        if vector is None:
+            vector = self.embed_query(question)
+        vector = np.asarray(vector, dtype='float32')
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, scope, question, vector=None):
+        """Return (answer, kind, vector) where kind is 'exact', 'semantic' or None on a miss.
+
+        The question vector is returned so a following put() does not embed it
+        again; callers that already embedded the question can pass it in.
+        """
+        key = (scope, normalize_question(question))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.answer, 'exact', entry.vector
+                del self._entries[key]
+                self.expirations += 1
+
+        if not self.semantic_enabled:
+            with self._lock:
+                self.misses += 1
+            return None, None, None
+
+        vector = self._embed(question, vector)
+        with self._lock:
+            candidates = [
+                (entry_key, entry) for entry_key, entry in self._entries.items()
+                if entry_key[0] == scope and entry.vector is not None and entry.expires > now
+            ]
+            if candidates:
+                import numpy as np
+
+                similarities = np.stack([entry.vector for _key, entry in candidates]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    best_key, best_entry = candidates[best]
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return best_entry.answer, 'semantic', vector
+            self.misses += 1
+        return None, None, vector
+
+    def put(self, scope, question, answer, vector=None):
+        """Store an answer; vector is the question embedding from get(), if any"""
+        if vector is None and self.semantic_enabled:
+            vector = self._embed(question)
+        key = (scope, normalize_question(question))
+        with self._lock:
+            self._entries[key] = _Entry(answer, vector, time.time() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, scope_prefix):
+        """Drop every entry whose scope starts with scope_prefix"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0].startswith(scope_prefix)]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'semantic_threshold': self.similarity_threshold if self.semantic_enabled else None,
+                'hits': self.hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -1,231 +1,855 @@
 import os
+import hashlib
 import json
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Request, Response, request, jsonify, send_from_directory, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
-import PyPDF2
-import re
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache, wraps
 from dotenv import load_dotenv
-from mistralai.client import MistralClient
-from mistralai.models.chat_completion import ChatMessage
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.chains import RetrievalQA
-from langchain.llms import MistralAI
-from langchain.chat_models import ChatMistralAI
-import tiktoken
+# langchain, the Mistral client, FAISS, tiktoken and the embedding model are imported on
+# first use (or by the background warm-up), so the process answers /health right away
+
+from answer_cache import AnswerCache, normalize_question
+from concurrency import ConcurrencyLimiter, RateLimiter
+from corpus_index import CorpusIndex, CorpusVectorStore
+from chunk_store import ChunkStoreBuilder
+from document_cache import DocumentCache, file_sha256
+from document_registry import Document, DocumentRegistry, is_valid_document_id
+from embeddings import embedding_service
+from jobs import Job, JobManager, QueueFullError
+from lexical_index import HYBRID_CANDIDATES_PER_K, RETRIEVAL_MODE, reciprocal_rank_fusion
+from llm_gateway import LLM_BACKEND, LLMGateway, make_backend
+from metrics import SERVER_TIMING, metrics, server_timing_header
+from summarizer import SUMMARY_PROMPT, MapReduceSummarizer, SharedStream
+from tokenizer import count_tokens, count_tokens_batch, get_encoding
+from upload_stream import UPLOAD_MAX_MB, HashingUploadFile, UploadRejected
+from pdf_extraction import PDF_EXTRACT_WORKERS, iter_pages
+from vector_index import EMBEDDING_PRECISION, INDEX_MODE, build_faiss_store
+from warmup import WARMUP_ENABLED, WarmUp
 
 # Load environment variables
 load_dotenv()
 
+UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(os.path.dirname(__file__), 'uploads'))
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+class UploadRequest(Request):
+    """Request whose uploaded files stream straight into UPLOAD_FOLDER, hashed on the way.
+    
+    Every file part written is recorded in uploads, so the ones not claimed by
+    an upload job can be deleted however the request ends.
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        upload = HashingUploadFile(UPLOAD_FOLDER, filename)
+        self.uploads.append(upload)
+        return upload
+    
+    @property
+    def uploads(self):
+        if 'uploads' not in self.__dict__:
+            self.__dict__['uploads'] = []
+        return self.__dict__['uploads']
+
 app = Flask(__name__)
+app.request_class = UploadRequest
+# Refuse oversized bodies from Content-Length alone; 1 MB covers the multipart framing
+app.config['MAX_CONTENT_LENGTH'] = (UPLOAD_MAX_MB + 1) * 1024 * 1024
 CORS(app)  # Enable CORS for frontend requests
+CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, 'cache')
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Initialize Mistral AI (MISTRAL_ENDPOINT points at a local fake server for offline testing;
+# LLM_BACKEND=fake answers in-process instead). Every model call goes through llm_gateway,
+# which adds deadlines, retries, hedging, rate limiting and token accounting.
+mistral_api_key = os.getenv('MISTRAL_API_KEY')
+mistral_endpoint = os.getenv('MISTRAL_ENDPOINT')
+llm_gateway = LLMGateway(make_backend(LLM_BACKEND, mistral_api_key, mistral_endpoint))
+mistral_configured = llm_gateway.configured
 
-# Global variables to store PDF data
-pdf_text = ""
-pdf_chunks = []
-vector_store = None
-current_filename = ""
+SUMMARY_UNAVAILABLE = "Unable to generate summary at this time."
+NO_API_KEY_MESSAGE = "Mistral AI API key not configured. Please set MISTRAL_API_KEY in your .env file."
+ANSWER_ERROR_MESSAGE = "I'm sorry, I encountered an error while processing your question. Please try again."
+NO_PDF_MESSAGE = "No PDF has been uploaded yet. Please upload a PDF first."
+UNCACHEABLE_ANSWERS = (NO_API_KEY_MESSAGE, ANSWER_ERROR_MESSAGE, NO_PDF_MESSAGE)
 
-# Initialize Mistral AI
-mistral_api_key = os.getenv('MISTRAL_API_KEY')
-mistral_client = MistralClient(api_key=mistral_api_key) if mistral_api_key else None
+# Shared by blocking and streamed answers so both give the same answers
+QA_PROMPT_TEMPLATE = """Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+{context}
+
+Question: {question}
+Helpful Answer:"""
+
+# Retrieval defaults; both can be overridden per /chat request
+QA_DEFAULT_K = int(os.getenv('QA_DEFAULT_K', '3'))
+QA_MAX_K = int(os.getenv('QA_MAX_K', '20'))
+QA_MAX_CONTEXT_TOKENS = int(os.getenv('QA_MAX_CONTEXT_TOKENS', '3000'))
+
+# /chat/batch: questions per request, Mistral calls in flight per batch, and calls started
+# per second across all batches (0 = unlimited)
+CHAT_BATCH_MAX_QUESTIONS = int(os.getenv('CHAT_BATCH_MAX_QUESTIONS', '50'))
+CHAT_BATCH_CONCURRENCY = int(os.getenv('CHAT_BATCH_CONCURRENCY', '4'))
+CHAT_BATCH_RATE_PER_SECOND = float(os.getenv('CHAT_BATCH_RATE_PER_SECOND', '5'))
+
+# chars measures chunks in characters (the original behaviour); tokens uses the shared tokenizer
+CHUNK_MODE = os.getenv('CHUNK_MODE', 'chars')
+CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', '256'))
+CHUNK_TOKEN_OVERLAP = int(os.getenv('CHUNK_TOKEN_OVERLAP', '50'))
 
 class PDFProcessor:
-    def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
-    
-    def extract_text_from_pdf(self, filepath):
-        """Extract text from PDF file"""
-        try:
-            with open(filepath, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                text = ""
-                for page_num, page in enumerate(reader.pages):
-                    page_text = page.extract_text() or ""
-                    text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
-                return text
-        except Exception as e:
-            print(f"Error extracting text from PDF: {e}")
-            return ""
+    def __init__(self, chunk_size=None, chunk_overlap=None, extract_workers=PDF_EXTRACT_WORKERS,
+                 chunk_mode=CHUNK_MODE):
+        if chunk_mode not in ('chars', 'tokens'):
+            raise ValueError(f"Unknown chunk mode: {chunk_mode}")
+        token_mode = chunk_mode == 'tokens'
+        self.chunk_mode = chunk_mode
+        self.chunk_size = chunk_size or (CHUNK_TOKENS if token_mode else 1000)
+        self.chunk_overlap = chunk_overlap if chunk_overlap is not None else (CHUNK_TOKEN_OVERLAP if token_mode else 200)
+        self.extract_workers = extract_workers
+        self._text_splitter = None
     
-    def split_text_into_chunks(self, text):
-        """Split text into manageable chunks for processing"""
-        if not text.strip():
-            return []
+    @property
+    def text_splitter(self):
+        """LangChain splitter, built on first use"""
+        if self._text_splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size,
+                chunk_overlap=self.chunk_overlap,
+                length_function=count_tokens if self.chunk_mode == 'tokens' else len,
+            )
+        return self._text_splitter
+    
+    def cache_settings(self):
+        """Settings that change the processed output, used in cache keys"""
+        return {
+            'chunk_mode': self.chunk_mode,
+            'chunk_scope': 'page',
+            # Chunks hold only page text; the page number is span metadata
+            'chunk_text': 'unmarked',
+            'chunk_size': self.chunk_size,
+            'chunk_overlap': self.chunk_overlap,
+            'embedding_model': embedding_service.model_name,
+            'embedding_precision': EMBEDDING_PRECISION,
+            'index_mode': INDEX_MODE,
+        }
+    
+    def page_block(self, page_text):
+        """Text of one page as it is stored in the document text, which separates pages by a blank line"""
+        return f"{page_text}\n\n"
+    
+    def iter_pages(self, filepath, progress=None, known_pages=None):
+        """Yield (page_number, text, page_hash) in order; large PDFs are extracted on a process pool.
         
-        # Clean the text
-        text = re.sub(r'\s+', ' ', text).strip()
+        Pages found in known_pages ({page_hash: text}) reuse that text instead of being extracted.
+        """
+        for page_num, page_text, pages_total, page_hash in iter_pages(
+                filepath, workers=self.extract_workers, known_pages=known_pages):
+            if progress:
+                progress(page_num, pages_total)
+            yield page_num, page_text, page_hash
+    
+    def iter_chunks(self, pages):
+        """Chunk (page_number, text) pairs incrementally as they are extracted.
         
-        # Split into chunks
-        chunks = self.text_splitter.split_text(text)
-        return chunks
+        Chunks never cross a page boundary, so an edit on one page leaves the
+        chunks of every other page unchanged for the next revision. Each chunk
+        is an exact slice of its page block, which lets ChunkStoreBuilder store
+        it as a span of the document text.
+        """
+        for page_num, page_text in pages:
+            yield from self.text_splitter.split_text(self.page_block(page_text))
+    
+    def chunk_hash(self, chunk):
+        """Content hash of a chunk; chunks carry no page number, so renumbered pages still match"""
+        return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
     
-    def create_vector_store(self, chunks):
-        """Create vector store from text chunks"""
+    def create_vector_store(self, chunks, progress=None, run_stats=None, reused_vectors=None):
+        """Create vector store from a ChunkStore; progress(chunks_done, chunks_total) is called per batch.
+        
+        Chunks whose hash is in reused_vectors ({chunk_hash: vector}) take that
+        vector instead of being embedded again.
+        """
         try:
             if not chunks:
                 return None
+            import numpy as np
             
-            # Use HuggingFace embeddings (free alternative to OpenAI)
-            embeddings = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2",
-                model_kwargs={'device': 'cpu'}
-            )
-            vector_store = FAISS.from_texts(chunks, embeddings)
-            return vector_store
+            reused_vectors = reused_vectors or {}
+            hashes = [self.chunk_hash(chunk) for chunk in chunks]
+            missing = [i for i, chunk_hash in enumerate(hashes) if chunk_hash not in reused_vectors]
+            reused = len(chunks) - len(missing)
+            
+            # Shared HuggingFace embeddings (loaded once per process), encoded in explicit batches
+            with metrics.span('embed'):
+                embedded, run = embedding_service.embed_documents(
+                    [chunks[i] for i in missing],
+                    progress=progress and (lambda done, total: progress(reused + done, len(chunks))))
+            if reused:
+                dim = len(next(iter(reused_vectors.values())))
+                vectors = np.empty((len(chunks), dim), dtype='float32')
+                for i, chunk_hash in enumerate(hashes):
+                    if chunk_hash in reused_vectors:
+                        vectors[i] = reused_vectors[chunk_hash]
+                if missing:
+                    vectors[missing] = embedded
+            else:
+                vectors = embedded
+            if run_stats is not None:
+                run_stats.update(run, reused=reused)
+            with metrics.span('index_build'):
+                return build_faiss_store(chunks, vectors, embedding_service.get())
         except Exception as e:
             print(f"Error creating vector store: {e}")
             return None
 
 class AIAssistant:
     def __init__(self):
-        if mistral_client:
-            self.llm = ChatMistralAI(
-                model="mistral-small-latest",
-                temperature=0.7,
-                max_tokens=1000
-            )
-        else:
-            self.llm = None
+        # vector store -> {k: retriever}; entries go away with their vector store
+        self._retrievers = weakref.WeakKeyDictionary()
+        self._retrievers_lock = threading.Lock()
+        self._summarizer = None
+    
+    def get_retriever(self, vector_store, k=QA_DEFAULT_K, lexical_search=None):
+        """Retriever for a vector store and k, built once and reused.
+        
+        With a lexical_search(query, n) for the same chunks, BM25 and vector
+        rankings are fused (RETRIEVAL_MODE=hybrid).
+        """
+        with self._retrievers_lock:
+            by_k = self._retrievers.setdefault(vector_store, {})
+            if k not in by_k:
+                if lexical_search is not None and RETRIEVAL_MODE == 'hybrid':
+                    from retrievers import HybridRetriever
+                    by_k[k] = HybridRetriever(vector_store=vector_store, lexical_search=lexical_search, k=k)
+                else:
+                    by_k[k] = vector_store.as_retriever(search_kwargs={"k": k})
+            return by_k[k]
+    
+    def retrieve_context(self, question, vector_store, k=QA_DEFAULT_K, max_context_tokens=QA_MAX_CONTEXT_TOKENS,
+                         lexical_search=None):
+        """Top-k chunks for a question, trimmed to fit the context token budget"""
+        with metrics.span('retrieval'):
+            docs = self.get_retriever(vector_store, k, lexical_search).get_relevant_documents(question)
+        return self._fit_context(docs, max_context_tokens)
+    
+    def retrieve_context_batch(self, questions, vectors, vector_store, k=QA_DEFAULT_K,
+                               max_context_tokens=QA_MAX_CONTEXT_TOKENS, lexical_search=None):
+        """retrieve_context for several questions with one batched FAISS search.
+        
+        vectors holds the question embeddings, one row per question. A chunk
+        retrieved for several questions is looked up once and shared. Returns
+        (contexts, number of distinct chunks retrieved).
+        """
+        hybrid = lexical_search is not None and RETRIEVAL_MODE == 'hybrid'
+        fetch_k = min(k * HYBRID_CANDIDATES_PER_K if hybrid else k, vector_store.index.ntotal)
+        with metrics.span('retrieval'):
+            _distances, positions = vector_store.index.search(vectors, fetch_k)
+            chunks = {
+                position: vector_store.docstore.search(vector_store.index_to_docstore_id[position])
+                for position in set(positions.ravel().tolist()) if position != -1
+            }
+            contexts = []
+            for question, row in zip(questions, positions.tolist()):
+                docs = [chunks[position] for position in row if position != -1]
+                if hybrid:
+                    docs = reciprocal_rank_fusion([docs, lexical_search(question, fetch_k)], k)
+                contexts.append(self._fit_context(docs[:k], max_context_tokens))
+        return contexts, len(chunks)
+    
+    def _fit_context(self, docs, max_context_tokens):
+        """Leading chunks that fit the context token budget"""
+        selected = []
+        used = 0
+        for doc in docs:
+            # Stored at indexing time; older cache entries fall back to counting here
+            tokens = doc.metadata.get('tokens')
+            if tokens is None:
+                tokens = count_tokens(doc.page_content)
+            # Always keep the best chunk, even when it alone exceeds the budget
+            if selected and used + tokens > max_context_tokens:
+                break
+            selected.append(doc)
+            used += tokens
+        return selected
+    
+    @property
+    def summarizer(self):
+        """Map-reduce summarizer whose section calls go through the LLM gateway"""
+        if self._summarizer is None:
+            self._summarizer = MapReduceSummarizer(self._complete, get_encoding())
+        return self._summarizer
+    
+    def _summary_prompt(self, text):
+        """Build the prompt for a summary of a document that fits in one call"""
+        return SUMMARY_PROMPT.format(text=text)
+    
+    def _complete(self, prompt, max_tokens):
+        """One blocking completion for summarization"""
+        with metrics.span('llm_summary_section'):
+            return llm_gateway.complete(prompt, max_tokens, temperature=0.3, purpose='summary_section')
+    
+    def _final_summary_prompt(self, text):
+        """Prompt for the final summary call: the whole text if short, else reduced section summaries"""
+        sections = self.summarizer.split_sections(text)
+        if len(sections) <= 1:
+            return self._summary_prompt(text)
+        summaries = self.summarizer.map(sections)
+        return self.summarizer.reduce_prompt(summaries)
     
     def generate_summary(self, text):
-        """Generate a comprehensive summary of the PDF"""
+        """Generate a comprehensive summary of the whole PDF (map-reduce for long documents)"""
         try:
             if not text.strip():
                 return "No text content found in the PDF."
             
-            if not mistral_client:
-                return "Mistral AI API key not configured. Please set MISTRAL_API_KEY in your .env file."
-            
-            # Truncate text if too long
-            max_tokens = 3000
-            encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")  # Using this as reference
-            tokens = encoding.encode(text)
-            if len(tokens) > max_tokens:
-                text = encoding.decode(tokens[:max_tokens])
-            
-            prompt = f"""
-            Please provide a comprehensive summary of the following document. 
-            Include:
-            1. Main topics and themes
-            2. Key findings and conclusions
-            3. Important data or statistics mentioned
-            4. Overall purpose and scope of the document
-            
-            Document content:
-            {text}
-            
-            Summary:
-            """
-            
-            messages = [
-                ChatMessage(role="user", content=prompt)
-            ]
+            if not mistral_configured:
+                return NO_API_KEY_MESSAGE
             
-            response = mistral_client.chat(
-                model="mistral-small-latest",
-                messages=messages,
-                max_tokens=500,
-                temperature=0.3
-            )
+            prompt = self._final_summary_prompt(text)
+            with metrics.span('llm_summary'):
+                summary = llm_gateway.complete(prompt, 500, temperature=0.3, purpose='summary')
             
-            return response.choices[0].message.content.strip()
+            return summary.strip()
             
         except Exception as e:
             print(f"Error generating summary: {e}")
-            return "Unable to generate summary at this time."
+            return SUMMARY_UNAVAILABLE
+    
+    def summary_from_sections(self, incremental, text):
+        """Finish a summary whose section summaries were started during extraction"""
+        try:
+            if not incremental.started:
+                return self.generate_summary(text)
+            return incremental.summary()
+        except Exception as e:
+            print(f"Error generating summary: {e}")
+            return SUMMARY_UNAVAILABLE
+    
+    def stream_summary(self, text):
+        """Yield the summary piece by piece as the model produces it"""
+        if not text.strip():
+            yield "No text content found in the PDF."
+            return
+        
+        if not mistral_configured:
+            yield NO_API_KEY_MESSAGE
+            return
+        
+        try:
+            # Section summaries (if any) are computed first; the final call is streamed
+            yield from llm_gateway.stream(self._final_summary_prompt(text), 500, temperature=0.3,
+                                          purpose='summary')
+        except Exception as e:
+            print(f"Error streaming summary: {e}")
+            yield SUMMARY_UNAVAILABLE
     
-    def answer_question(self, question, vector_store):
-        """Answer questions using the vector store and AI"""
+    def answer_question(self, question, vector_store, k=QA_DEFAULT_K, max_context_tokens=QA_MAX_CONTEXT_TOKENS,
+                        lexical_search=None, sources=None):
+        """Answer questions using the vector store and AI; sources, if given, receives the chunks used"""
         try:
             if not vector_store:
-                return "No PDF has been uploaded yet. Please upload a PDF first."
+                return NO_PDF_MESSAGE
             
-            if not mistral_client:
-                return "Mistral AI API key not configured. Please set MISTRAL_API_KEY in your .env file."
+            if not mistral_configured:
+                return NO_API_KEY_MESSAGE
             
-            # Create a retrieval QA chain
-            qa_chain = RetrievalQA.from_chain_type(
-                llm=self.llm,
-                chain_type="stuff",
-                retriever=vector_store.as_retriever(search_kwargs={"k": 3})
-            )
+            # Reuse the cached retriever
+            docs = self.retrieve_context(question, vector_store, k, max_context_tokens, lexical_search)
+            if sources is not None:
+                sources.extend(docs)
             
             # Get the answer
-            result = qa_chain.run(question)
-            return result.strip()
+            return self.answer_from_context(question, docs)
             
         except Exception as e:
             print(f"Error answering question: {e}")
-            return "I'm sorry, I encountered an error while processing your question. Please try again."
+            return ANSWER_ERROR_MESSAGE
+    
+    def qa_prompt(self, question, docs):
+        """The question with its context chunks, as one prompt"""
+        context = "\n\n".join(doc.page_content for doc in docs)
+        return QA_PROMPT_TEMPLATE.format(context=context, question=question)
+    
+    def answer_from_context(self, question, docs):
+        """Answer a question from chunks that were already retrieved"""
+        try:
+            with metrics.span('llm'):
+                result = llm_gateway.complete(self.qa_prompt(question, docs), 1000, temperature=0.7)
+            return result.strip()
+        except Exception as e:
+            print(f"Error answering question: {e}")
+            return ANSWER_ERROR_MESSAGE
+    
+    def stream_answer(self, question, vector_store, k=QA_DEFAULT_K, max_context_tokens=QA_MAX_CONTEXT_TOKENS,
+                      lexical_search=None, sources=None):
+        """Yield the answer token by token using the same retrieval as answer_question"""
+        if not vector_store:
+            yield NO_PDF_MESSAGE
+            return
+        
+        if not mistral_configured:
+            yield NO_API_KEY_MESSAGE
+            return
+        
+        try:
+            docs = self.retrieve_context(question, vector_store, k, max_context_tokens, lexical_search)
+            if sources is not None:
+                sources.extend(docs)
+            start = time.perf_counter()
+            first_token = True
+            for token in llm_gateway.stream(self.qa_prompt(question, docs), 1000, temperature=0.7):
+                if first_token:
+                    metrics.observe('llm_first_token', time.perf_counter() - start)
+                    first_token = False
+                yield token
+            metrics.observe('llm', time.perf_counter() - start)
+        except Exception as e:
+            print(f"Error streaming answer: {e}")
+            yield ANSWER_ERROR_MESSAGE
 
 # Initialize processors
 pdf_processor = PDFProcessor()
 ai_assistant = AIAssistant()
+corpus_index = CorpusIndex()
+# The cache is the only stored copy of a document: evicting an entry drops the document from the library
+document_cache = DocumentCache(CACHE_FOLDER, on_evict=lambda document_id: forget_document(document_id))
+document_registry = DocumentRegistry(document_cache, embedding_service.get)
+job_manager = JobManager(state_dir=os.path.join(UPLOAD_FOLDER, 'jobs'))
+answer_cache = AnswerCache(embed_query=lambda question: embedding_service.get().embed_query(question))
+request_limiter = ConcurrencyLimiter()
+batch_rate_limiter = RateLimiter(CHAT_BATCH_RATE_PER_SECOND, burst=CHAT_BATCH_CONCURRENCY)
+
+def limit_concurrency(view):
+    """Run the view only when a request slot is free; answer 429 when the process is saturated"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not request_limiter.acquire():
+            metrics.count('request_rejected')
+            response = jsonify({'error': 'The server is busy. Please retry in a moment.'})
+            response.headers['Retry-After'] = '1'
+            return response, 429
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        except BaseException:
+            request_limiter.release()
+            raise
+        if response.is_streamed:
+            # A streamed answer keeps its slot until the last event has been sent
+            response.call_on_close(request_limiter.release)
+        else:
+            request_limiter.release()
+        return response
+    return wrapper
+
+@lru_cache(maxsize=64)
+def corpus_vector_store(document_ids):
+    """Corpus-wide vector store for a (sorted) tuple of document ids, reused across requests"""
+    return CorpusVectorStore(corpus_index, embedding_service.get(), list(document_ids) or None)
+
+def add_to_corpus(document, replaces=None):
+    """Add a document's chunks to the persistent corpus index unless already there.
+    
+    With replaces, that earlier version leaves the corpus in the same step.
+    """
+    if corpus_index.contains(document.document_id) and not replaces:
+        return
+    index = document.vector_store.index
+    chunk_tokens = [document.chunks.tokens(i) for i in range(len(document.chunks))]
+    chunk_locations = [document.chunks.location(i) for i in range(len(document.chunks))]
+    with metrics.span('corpus_add'):
+        corpus_index.add_document(document.document_id, document.filename, document.chunks,
+                                  index.reconstruct_n(0, index.ntotal), chunk_tokens, replaces=replaces,
+                                  chunk_locations=chunk_locations)
+    answer_cache.invalidate('corpus')
+
+def reusable_pages(document):
+    """{page_hash: text} of a document's pages, when its cache entry recorded them"""
+    pages = document_cache.get_pages(document.document_id) or []
+    text = document.text if pages else ''
+    return {page['hash']: text[page['start']:page['end']] for page in pages}
+
+def reusable_vectors(document):
+    """{chunk_hash: vector} of a document's chunks, read back from its index"""
+    index = document.vector_store.index
+    try:
+        vectors = index.reconstruct_n(0, index.ntotal)
+    except RuntimeError as e:
+        print(f"Error reading vectors of document {document.document_id}: {e}")
+        return {}
+    return {pdf_processor.chunk_hash(chunk): vector for chunk, vector in zip(document.chunks, vectors)}
+
+def forget_document(document_id):
+    """Drop a document from the corpus, the registry and the answer cache; returns the chunks removed"""
+    removed = corpus_index.remove_document(document_id)
+    document_registry.remove(document_id)
+    answer_cache.invalidate(document_id)
+    answer_cache.invalidate('corpus')
+    return removed
+
+def retire_version(document_id):
+    """Drop the cached answers and cache entry of a version that has been replaced"""
+    answer_cache.invalidate(document_id)
+    document_cache.remove(document_id)
+
+@app.before_request
+def start_request_timing():
+    metrics.start_request()
+
+@app.after_request
+def record_request_timing(response):
+    """Record request latency and send the stage breakdown as a Server-Timing header"""
+    # The route pattern, not the path, so /jobs/<job_id> stays one series
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    timings = metrics.finish_request(request.method, endpoint, response.status_code)
+    if SERVER_TIMING and timings:
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+def wants_stream():
+    """True when the client asked for a Server-Sent Events response"""
+    data = request.get_json(silent=True) or {}
+    flag = data.get('stream', request.args.get('stream', ''))
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+def sse_response(tokens, done_payload):
+    """Stream tokens as Server-Sent Events, ending with a 'done' event"""
+    return sse_events(({'token': token} for token in tokens), done_payload)
+
+def sse_events(events, done_payload):
+    """Stream JSON events as Server-Sent Events; done_payload is serialized after the last one"""
+    def generate():
+        for event in events:
+            yield f"data: {json.dumps(event)}\n\n"
+        yield f"event: done\ndata: {json.dumps(done_payload)}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def citations(docs, document=None):
+    """Where each context chunk came from, in context order.
+    
+    Chunk metadata carries its page and character offsets into the document
+    text (the chunk store or the corpus index records them at indexing time),
+    so no second search over the text is needed. Chunks of a single document
+    take its id and filename from document.
+    """
+    result = []
+    for doc in docs:
+        metadata = doc.metadata
+        citation = {
+            'document_id': metadata.get('document_id', document.document_id if document else None),
+            'filename': metadata.get('filename', document.filename if document else None),
+            'chunk': metadata.get('chunk'),
+        }
+        citation.update((key, metadata[key]) for key in ('page', 'start', 'end') if key in metadata)
+        result.append(citation)
+    return result
+
+def retrieval_params(data):
+    """(k, max_context_tokens) from a chat request body; raises ValueError with a user-facing message"""
+    try:
+        k = int(data.get('k', QA_DEFAULT_K))
+        max_context_tokens = int(data.get('max_context_tokens', QA_MAX_CONTEXT_TOKENS))
+    except (TypeError, ValueError):
+        raise ValueError('k and max_context_tokens must be integers')
+    if not 1 <= k <= QA_MAX_K or max_context_tokens < 1:
+        raise ValueError(f'k must be between 1 and {QA_MAX_K} and max_context_tokens positive')
+    return k, max_context_tokens
+
+def requested_document_id():
+    """Document id from the JSON body or query string; None means the latest upload"""
+    data = request.get_json(silent=True) or {}
+    return (data.get('document_id') or request.args.get('document_id') or '').strip() or None
+
+class UploadError(Exception):
+    """A user-facing processing failure (bad or unreadable PDF)"""
+
+def store_summary(document, summary):
+    """Keep a successfully generated summary in memory and in the on-disk cache"""
+    if mistral_configured and summary not in (SUMMARY_UNAVAILABLE, NO_API_KEY_MESSAGE):
+        document.summary = summary
+        document_cache.put_summary(document.document_id, summary)
+
+def ensure_summary(document, incremental=None):
+    """Return the document's summary, generating and caching it on first use"""
+    # Concurrent /summary calls for one document wait for a single generation
+    with document.summary_lock:
+        if document.summary is not None:
+            return document.summary
+        with metrics.span('summary'):
+            if incremental is not None:
+                summary = ai_assistant.summary_from_sections(incremental, document.text)
+            else:
+                summary = ai_assistant.generate_summary(document.text)
+        store_summary(document, summary)
+        return summary
+
+def summary_tokens(document):
+    """Tokens of the document's summary for a streamed response.
+    
+    A cached summary is sent whole. Otherwise the summary is streamed from a
+    single generation that holds the summary lock like ensure_summary does:
+    concurrent streamed requests replay the same tokens, and the result is
+    stored once it is complete.
+    """
+    if document.summary is not None:
+        return [document.summary]
+    stream = document.summary_stream
+    if stream is None and document.summary_lock.acquire(blocking=False):
+        if document.summary is not None:
+            document.summary_lock.release()
+            return [document.summary]
+        stream = document.summary_stream = SharedStream()
+        
+        def produce():
+            try:
+                failed = False
+                with metrics.span('summary'):
+                    for token in ai_assistant.stream_summary(document.text):
+                        # Errors arrive as a final message token, possibly after a partial summary
+                        failed = failed or token in (SUMMARY_UNAVAILABLE, NO_API_KEY_MESSAGE)
+                        stream.put(token)
+                if not failed:
+                    store_summary(document, stream.text().strip())
+            finally:
+                document.summary_stream = None
+                stream.close()
+                document.summary_lock.release()
+        
+        # Runs to completion even if the client disconnects, so the summary is still stored
+        threading.Thread(target=produce, name='summary-stream', daemon=True).start()
+    if stream is None:
+        stream = document.summary_stream
+    if stream is None:
+        # A non-streamed generation is running; wait for it
+        return [ensure_summary(document)]
+    return stream
+
+def process_upload(job, filepath, filename, defer_summary=False, file_hash=None, replaces=None):
+    """Upload pipeline: hash, extract, chunk, embed, then (optionally) summarize.
+    
+    A revised PDF reuses the extracted text of unchanged pages and the
+    embeddings of unchanged chunks from its previous version, then replaces it.
+    The uploaded file at filepath is deleted when the job ends, however it ends.
+    """
+    # Read by the error handler, so set before anything can fail
+    incremental = None
+    try:
+        job.start_stage('hash')
+        # Streamed uploads arrive already hashed; the cache key doubles as the document id
+        document_id = document_cache.make_key(file_hash or file_sha256(filepath), pdf_processor.cache_settings())
+        job.update(document_id=document_id)
+        # Only an explicit replaces revises a document: unrelated uploads often share a filename
+        previous = document_registry.get(replaces) if replaces else None
+        if replaces and previous is None:
+            raise UploadError('Unknown document id to replace')
+        if previous is not None and previous.document_id == document_id:
+            previous = None
+        document = document_registry.get(document_id)
+        cached = document is not None
+        embedding_run = None
+        revision = None
+        if not cached:
+            # Extract text; pages are chunked as soon as they come out of the extraction pool
+            job.start_stage('extract')
+            has_text = False
+            # The text is stored once; chunks become spans into it
+            chunk_builder = ChunkStoreBuilder()
+            # Content hash and text span of every page, so the next revision can reuse them
+            pages = []
+            text_length = 0
+            known_pages = reusable_pages(previous) if previous else {}
+            # Section summaries start while later pages are still being extracted
+            if mistral_configured and not defer_summary:
+                incremental = ai_assistant.summarizer.incremental()
+            
+            # Extraction and chunking interleave; time spent waiting on pages counts as extraction
+            extract_seconds = 0.0
+            
+            def extracted_pages():
+                nonlocal extract_seconds, text_length, has_text
+                extracted = pdf_processor.iter_pages(
+                    filepath, progress=lambda done, total: job.update(pages_processed=done, pages_total=total),
+                    known_pages=known_pages)
+                while True:
+                    start = time.perf_counter()
+                    page = next(extracted, None)
+                    extract_seconds += time.perf_counter() - start
+                    if page is None:
+                        return
+                    page_num, page_text, page_hash = page
+                    page_block = pdf_processor.page_block(page_text)
+                    has_text = has_text or bool(page_text.strip())
+                    chunk_builder.add_page(page_num, page_block)
+                    pages.append({'hash': page_hash, 'start': text_length, 'end': text_length + len(page_text)})
+                    text_length += len(page_block)
+                    if incremental:
+                        incremental.add_page(page_block)
+                    yield page_num, page_text
+            
+            try:
+                chunking_started = time.perf_counter()
+                chunk_texts = []
+                for chunk in pdf_processor.iter_chunks(extracted_pages()):
+                    chunk_builder.add_chunk(chunk)
+                    chunk_texts.append(chunk)
+                # Token counts are computed once here and stored with the chunk spans
+                chunks = chunk_builder.build(count_tokens_batch(chunk_texts))
+                # From here on only the spans are kept
+                del chunk_texts
+                metrics.observe('extract', extract_seconds)
+                metrics.observe('chunk', time.perf_counter() - chunking_started - extract_seconds)
+            except Exception as e:
+                print(f"Error extracting text from PDF: {e}")
+                raise UploadError('Could not extract text from PDF. The file might be corrupted or contain only images.')
+            if not has_text:
+                raise UploadError('Could not extract text from PDF. The file might be corrupted or contain only images.')
+            if not chunks:
+                raise UploadError('Failed to process PDF text into chunks')
+            job.update(chunks_total=len(chunks))
+            
+            # Create vector store
+            job.start_stage('embed')
+            embedding_run = {}
+            store = pdf_processor.create_vector_store(
+                chunks, progress=lambda done, total: job.update(chunks_embedded=done), run_stats=embedding_run,
+                reused_vectors=reusable_vectors(previous) if previous else None)
+            if not store:
+                raise UploadError('Failed to create vector store for AI processing')
+            if previous:
+                revision = {
+                    'pages_reused': sum(1 for page in pages if page['hash'] in known_pages),
+                    'pages_total': len(pages),
+                    'chunks_reused': embedding_run.get('reused', 0),
+                    'chunks_total': len(chunks)
+                }
+            
+            job.start_stage('store')
+            with metrics.span('cache_store'):
+                if document_cache.put(document_id, chunks, store, meta={'filename': filename}, pages=pages) \
+                        and document_cache.memory_map:
+                    chunks.use_file(document_cache.text_path(document_id))
+                    document_cache.map_index(document_id, store)
+            document = Document(document_id, filename, chunks, store)
+        
+        # The new version becomes visible in the registry and the corpus at once, then the old one is retired
+        if previous:
+            document_registry.replace(previous.document_id, document)
+        else:
+            document_registry.add(document)
+        job.start_stage('corpus')
+        add_to_corpus(document, replaces=previous.document_id if previous else None)
+        if previous:
+            retire_version(previous.document_id)
+        
+        # The document is queryable from here on; the summary is its own stage
+        summary = document.summary
+        if summary is None and not defer_summary:
+            job.start_stage('summary')
+            summary = ensure_summary(document, incremental)
+        
+        job.complete({
+            'message': f'PDF "{filename}" uploaded and processed successfully!',
+            'document_id': document_id,
+            'filename': filename,
+            'pages': len(document.chunks),
+            'summary': summary,
+            'cached': cached,
+            'embedding': embedding_run,
+            'replaced': previous.document_id if previous else None,
+            'revision': revision
+        })
+    except UploadError as e:
+        job.fail(str(e))
+    finally:
+        # Section summaries still queued for a failed upload, or one that no longer needs them
+        if incremental:
+            incremental.cancel()
+        # The document cache keeps everything later requests need; the PDF itself is not kept
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
 
 @app.route('/upload', methods=['POST'])
+@limit_concurrency
 def upload_pdf():
-    global pdf_text, pdf_chunks, vector_store, current_filename
-    
     try:
-        if 'pdf' not in request.files:
+        # Parsing the form streams each file part to disk and hashes it (see UploadRequest)
+        try:
+            with metrics.span('upload_save'):
+                files = request.files
+        except RequestEntityTooLarge:
+            return jsonify({'error': f'PDF exceeds the {UPLOAD_MAX_MB} MB upload limit'}), 413
+        except UploadRejected as e:
+            return jsonify({'error': str(e)}), e.status_code
+        
+        # Parts other than 'pdf', and the file itself on any error below, are deleted in discard_unclaimed_uploads
+        file = files.get('pdf')
+        if file is None:
             return jsonify({'error': 'No PDF file provided'}), 400
         
-        file = request.files['pdf']
+        upload = file.stream
+        upload.close()
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        if not file.filename.lower().endswith('.pdf'):
+        if not file.filename.lower().endswith('.pdf') or not upload.is_pdf:
             return jsonify({'error': 'Only PDF files are allowed'}), 400
         
-        # Save file
-        filename = file.filename
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
-        
-        # Extract text
-        pdf_text = pdf_processor.extract_text_from_pdf(filepath)
-        if not pdf_text.strip():
-            return jsonify({'error': 'Could not extract text from PDF. The file might be corrupted or contain only images.'}), 400
-        
-        # Split into chunks
-        pdf_chunks = pdf_processor.split_text_into_chunks(pdf_text)
-        if not pdf_chunks:
-            return jsonify({'error': 'Failed to process PDF text into chunks'}), 400
-        
-        # Create vector store
-        vector_store = pdf_processor.create_vector_store(pdf_chunks)
-        if not vector_store:
-            return jsonify({'error': 'Failed to create vector store for AI processing'}), 400
-        
-        current_filename = filename
+        filename = upload.filename
+        defer_summary = request.form.get('defer_summary', '').lower() in ('1', 'true', 'yes')
+        # Id of the version this upload revises, if any
+        replaces = request.form.get('replaces') or None
+        if replaces and not is_valid_document_id(replaces):
+            return jsonify({'error': 'Unknown document id to replace'}), 404
+        try:
+            job = job_manager.submit(Job(filename), process_upload, upload.path, filename, defer_summary,
+                                     upload.sha256(), replaces)
+        except QueueFullError as e:
+            return jsonify({'error': str(e)}), 503
+        # process_upload deletes the file when the job ends
+        upload.claimed = True
         
-        # Generate initial summary
-        summary = ai_assistant.generate_summary(pdf_text)
+        # ?wait=1 keeps the old blocking behaviour for simple clients
+        if request.args.get('wait', '').lower() in ('1', 'true', 'yes'):
+            job.future.result()
+            if job.status == 'failed':
+                return jsonify({'error': job.error, 'job_id': job.job_id}), 400
+            return jsonify(dict(job.result, job_id=job.job_id))
         
         return jsonify({
-            'message': f'PDF "{filename}" uploaded and processed successfully!',
-            'filename': filename,
-            'pages': len(pdf_chunks),
-            'summary': summary
-        })
+            'message': f'PDF "{filename}" received, processing started',
+            'job_id': job.job_id,
+            'status_url': f'/jobs/{job.job_id}'
+        }), 202
         
     except Exception as e:
         print(f"Error in upload: {e}")
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
+@app.teardown_request
+def discard_unclaimed_uploads(error=None):
+    """Delete file parts no upload job took over: rejected, malformed or truncated requests"""
+    for upload in request.uploads:
+        if not upload.claimed:
+            upload.discard()
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    snapshot = job_manager.snapshot(job_id)
+    if not snapshot:
+        return jsonify({'error': 'Unknown job id'}), 404
+    return jsonify(snapshot)
+
 @app.route('/chat', methods=['POST'])
+@limit_concurrency
 def chat():
-    global vector_store, pdf_text
-    
     try:
         data = request.json
         if not data:
@@ -235,58 +859,337 @@ def chat():
         if not question:
             return jsonify({'error': 'No question provided'}), 400
         
-        if not vector_store:
-            return jsonify({'error': 'No PDF uploaded yet. Please upload a PDF first.'}), 400
+        # scope=corpus searches every indexed document instead of a single one
+        if data.get('scope') == 'corpus':
+            document = None
+            document_id = None
+            document_ids = data.get('document_ids') or []
+            if not isinstance(document_ids, list) or not all(
+                    isinstance(document_id, str) and is_valid_document_id(document_id) for document_id in document_ids):
+                return jsonify({'error': 'document_ids must be a list of document ids'}), 400
+            document_ids = tuple(sorted(set(document_ids)))
+            # The index version keeps answers cached by one worker from outliving a change made by another
+            cache_scope = f"corpus@{corpus_index.version()}:" + ','.join(document_ids)
+            vector_store = corpus_vector_store(document_ids)
+            if not vector_store:
+                return jsonify({'error': 'The document library is empty. Please upload a PDF first.'}), 400
+            lexical_search = vector_store.lexical_search
+        else:
+            document = document_registry.get(requested_document_id())
+            if not document or not document.vector_store:
+                return jsonify({'error': 'No PDF uploaded yet. Please upload a PDF first.'}), 400
+            document_id = document.document_id
+            cache_scope = document_id
+            vector_store = document.vector_store
+            lexical_search = document.lexical_search
         
-        # Answer the question using AI
-        answer = ai_assistant.answer_question(question, vector_store)
+        try:
+            k, max_context_tokens = retrieval_params(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        cache_scope = f"{cache_scope}|k={k}|ctx={max_context_tokens}"
+        
+        # Repeated (or paraphrased) questions are answered from the cache, with their citations
+        with metrics.span('answer_cache'):
+            cached_answer, cache_kind, question_vector = answer_cache.get(cache_scope, question)
+        metrics.count('answer_cache', result=cache_kind or 'miss')
+        
+        if wants_stream():
+            done = {'question': question, 'document_id': document_id, 'cached': cache_kind or False}
+            if cached_answer is not None:
+                answer, done['citations'] = cached_answer
+                return sse_response([answer], done)
+            
+            def stream_and_cache():
+                parts = []
+                sources = []
+                for token in ai_assistant.stream_answer(question, vector_store, k, max_context_tokens,
+                                                        lexical_search, sources):
+                    parts.append(token)
+                    yield token
+                # The done event is serialized after the last token, so it can still be filled in
+                done['citations'] = citations(sources, document)
+                answer = "".join(parts).strip()
+                if answer and answer not in UNCACHEABLE_ANSWERS:
+                    answer_cache.put(cache_scope, question, (answer, done['citations']), question_vector)
+            
+            return sse_response(stream_and_cache(), done)
+        
+        if cached_answer is not None:
+            answer, cited = cached_answer
+        else:
+            # Answer the question using AI
+            sources = []
+            answer = ai_assistant.answer_question(question, vector_store, k, max_context_tokens,
+                                                     lexical_search, sources)
+            cited = citations(sources, document)
+            if answer not in UNCACHEABLE_ANSWERS:
+                answer_cache.put(cache_scope, question, (answer, cited), question_vector)
         
         return jsonify({
             'response': answer,
-            'question': question
+            'question': question,
+            'document_id': document_id,
+            'citations': cited,
+            'cached': cache_kind or False
         })
         
     except Exception as e:
         print(f"Error in chat: {e}")
         return jsonify({'error': f'Failed to process question: {str(e)}'}), 500
 
+def answer_batch(questions, document, k, max_context_tokens, in_order=True, stats=None):
+    """Yield {'index', 'question', 'response', 'citations', 'cached'} for each question about one document.
+    
+    Repeated questions are answered once. The remaining questions are embedded
+    in one call and searched in one batched FAISS search; answers come from
+    the cache or from Mistral calls running CHAT_BATCH_CONCURRENCY at a time
+    under batch_rate_limiter. Results are yielded in question order, or as
+    they complete when in_order is False. stats, if given, is filled in.
+    """
+    stats = {} if stats is None else stats
+    cache_scope = f"{document.document_id}|k={k}|ctx={max_context_tokens}"
+    groups = {}
+    for index, question in enumerate(questions):
+        groups.setdefault(normalize_question(question), []).append(index)
+    keys = list(groups)
+    stats.update(questions=len(questions), unique_questions=len(keys), cached=0, unique_chunks=0)
+    
+    def completed():
+        """(key, answer, citations, cached) per distinct question, in completion order"""
+        if not mistral_configured:
+            for key in keys:
+                yield key, NO_API_KEY_MESSAGE, [], False
+            return
+        try:
+            with metrics.span('embed_queries'):
+                vectors = embedding_service.embed_queries([questions[groups[key][0]] for key in keys])
+        except Exception as e:
+            print(f"Error embedding batch questions: {e}")
+            for key in keys:
+                yield key, ANSWER_ERROR_MESSAGE, [], False
+            return
+        
+        # (key, row in vectors, normalized vector for the answer cache) of every uncached question
+        pending = []
+        for row, key in enumerate(keys):
+            with metrics.span('answer_cache'):
+                cached_answer, kind, cache_vector = answer_cache.get(cache_scope, questions[groups[key][0]],
+                                                                     vectors[row])
+            metrics.count('answer_cache', result=kind or 'miss')
+            if cached_answer is not None:
+                stats['cached'] += len(groups[key])
+                response, cited = cached_answer
+                yield key, response, cited, kind
+            else:
+                pending.append((key, row, cache_vector))
+        if not pending:
+            return
+        
+        pending_questions = [questions[groups[key][0]] for key, _row, _vector in pending]
+        try:
+            contexts, stats['unique_chunks'] = ai_assistant.retrieve_context_batch(
+                pending_questions, vectors[[row for _key, row, _vector in pending]], document.vector_store,
+                k, max_context_tokens, document.lexical_search)
+        except Exception as e:
+            print(f"Error retrieving batch context: {e}")
+            for key, _row, _vector in pending:
+                yield key, ANSWER_ERROR_MESSAGE, [], False
+            return
+        
+        def answer(question, docs):
+            batch_rate_limiter.acquire()
+            return ai_assistant.answer_from_context(question, docs)
+        
+        pool = ThreadPoolExecutor(max_workers=min(CHAT_BATCH_CONCURRENCY, len(pending)))
+        try:
+            futures = {
+                pool.submit(answer, question, docs): (key, cache_vector, citations(docs, document))
+                for (key, _row, cache_vector), question, docs in zip(pending, pending_questions, contexts)
+            }
+            for future in as_completed(futures):
+                key, cache_vector, cited = futures[future]
+                result = future.result()
+                if result not in UNCACHEABLE_ANSWERS:
+                    answer_cache.put(cache_scope, questions[groups[key][0]], (result, cited), cache_vector)
+                yield key, result, cited, False
+        finally:
+            # A client that disconnects mid-stream cancels the calls not yet started
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    done = {}
+    next_index = 0
+    for key, answer, cited, cached in completed():
+        for index in groups[key]:
+            result = {'index': index, 'question': questions[index], 'response': answer, 'citations': cited,
+                      'cached': cached or False}
+            if not in_order:
+                yield result
+                continue
+            done[index] = result
+            while next_index in done:
+                yield done.pop(next_index)
+                next_index += 1
+
+@app.route('/chat/batch', methods=['POST'])
+@limit_concurrency
+def chat_batch():
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        return jsonify({'error': 'questions must be a non-empty list'}), 400
+    if len(questions) > CHAT_BATCH_MAX_QUESTIONS:
+        return jsonify({'error': f'At most {CHAT_BATCH_MAX_QUESTIONS} questions per batch'}), 400
+    if not all(isinstance(question, str) and question.strip() for question in questions):
+        return jsonify({'error': 'Every question must be a non-empty string'}), 400
+    questions = [question.strip() for question in questions]
+    
+    order = data.get('order', 'input')
+    if order not in ('input', 'completed'):
+        return jsonify({'error': "order must be 'input' or 'completed'"}), 400
+    try:
+        k, max_context_tokens = retrieval_params(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    document = document_registry.get(requested_document_id())
+    if not document or not document.vector_store:
+        return jsonify({'error': 'No PDF uploaded yet. Please upload a PDF first.'}), 400
+    
+    stats = {}
+    results = answer_batch(questions, document, k, max_context_tokens, order == 'input', stats)
+    done = {'document_id': document.document_id, 'stats': stats}
+    if wants_stream():
+        return sse_events(results, done)
+    
+    try:
+        return jsonify(dict(done, results=list(results)))
+    except Exception as e:
+        print(f"Error in batch chat: {e}")
+        return jsonify({'error': f'Failed to process questions: {str(e)}'}), 500
+
 @app.route('/summary', methods=['GET'])
+@limit_concurrency
 def get_summary():
-    global pdf_text
-    
-    if not pdf_text:
+    document = document_registry.get(requested_document_id())
+    if not document or not document.chunks:
         return jsonify({'error': 'No PDF uploaded yet'}), 400
     
+    if wants_stream():
+        return sse_response(summary_tokens(document),
+                            {'document_id': document.document_id})
+    
     try:
-        summary = ai_assistant.generate_summary(pdf_text)
-        return jsonify({'summary': summary})
+        summary = ensure_summary(document)
+        return jsonify({'summary': summary, 'document_id': document.document_id})
     except Exception as e:
         print(f"Error generating summary: {e}")
         return jsonify({'error': 'Failed to generate summary'}), 500
 
+@app.route('/documents', methods=['GET'])
+def list_documents():
+    # Only documents that can be opened by id, e.g. not ones whose cache entry failed to write
+    documents = [document for document in corpus_index.documents()
+                 if document_cache.contains(document['document_id'])]
+    return jsonify({'documents': documents})
+
+@app.route('/documents/<document_id>', methods=['DELETE'])
+def delete_document(document_id):
+    if not is_valid_document_id(document_id):
+        return jsonify({'error': 'Unknown document id'}), 404
+    removed = forget_document(document_id)
+    document_cache.remove(document_id)
+    if not removed:
+        return jsonify({'error': 'Unknown document id'}), 404
+    return jsonify({'message': 'Document removed', 'document_id': document_id, 'chunks_removed': removed})
+
 @app.route('/status', methods=['GET'])
 def get_status():
-    global current_filename, pdf_chunks, vector_store, mistral_client
+    document_id = requested_document_id()
+    document = document_registry.get(document_id)
+    if document_id and not document:
+        return jsonify({'error': 'Unknown document id'}), 404
     
     return jsonify({
-        'has_pdf': bool(current_filename),
-        'filename': current_filename,
-        'chunks_count': len(pdf_chunks) if pdf_chunks else 0,
-        'vector_store_ready': bool(vector_store),
-        'mistral_ai_configured': bool(mistral_client)
+        'has_pdf': bool(document),
+        'document_id': document.document_id if document else None,
+        'filename': document.filename if document else '',
+        'chunks_count': len(document.chunks) if document else 0,
+        'vector_store_ready': bool(document and document.vector_store),
+        'mistral_ai_configured': mistral_configured,
+        'embedding_model': embedding_service.stats(),
+        'document_cache': document_cache.stats(),
+        'documents': document_registry.stats(),
+        'upload_jobs': job_manager.stats(),
+        'corpus': corpus_index.stats(),
+        'answer_cache': answer_cache.stats(),
+        'requests': request_limiter.stats(),
+        'chat_batch': batch_rate_limiter.stats(),
+        'llm': llm_gateway.stats(),
+        'warm_up': warm_up_state.stats(),
+        'process': {
+            'pid': os.getpid(),
+            'worker': os.getenv('SERVER_WORKER_ID'),
+            'preload': preload_state.stats()
+        }
     })
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy', 'message': 'PDF Chatbot backend is running with Mistral AI'})
 
-if __name__ == '__main__':
-    # Check if Mistral AI API key is set
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    # Load balancers should route traffic here only once models and indexes are loaded
+    state = warm_up_state.stats()
+    return jsonify(state), 200 if state['ready'] else 503
+
+def check_api_key():
+    """Print setup instructions when the Mistral AI API key is missing"""
     if not os.getenv('MISTRAL_API_KEY'):
         print("Warning: MISTRAL_API_KEY not found in environment variables.")
         print("Please set your Mistral AI API key to use AI features.")
         print("You can create a .env file with: MISTRAL_API_KEY=your_api_key_here")
         print("Get your free API key from: https://console.mistral.ai/")
+
+warm_up_state = WarmUp()
+warm_up_state.add('embedding_model', embedding_service.warm_up)
+warm_up_state.add('tokenizer', get_encoding)
+warm_up_state.add('corpus_index', corpus_index.open)
+warm_up_state.add('text_splitter', lambda: pdf_processor.text_splitter)
+warm_up_state.add('llm_backend', llm_gateway.warm_up)
+
+def warm_up():
+    """Load models, libraries and indexes in the background so the first requests are fast"""
+    if WARMUP_ENABLED:
+        warm_up_state.start()
+
+# Loaded once in a pre-forking parent and shared copy-on-write with its workers.
+# Only loading happens here: no model inference, no threads, no open connections.
+preload_state = WarmUp()
+preload_state.add('embedding_model', embedding_service.get)
+preload_state.add('tokenizer', get_encoding)
+preload_state.add('corpus_index', corpus_index.open)
+preload_state.add('text_splitter', lambda: pdf_processor.text_splitter)
+
+def preload():
+    """Load models and indexes in the calling process before it forks its workers"""
+    preload_state.run()
+
+if __name__ == '__main__':
+    # Check if Mistral AI API key is set
+    check_api_key()
+    
+    # With debug=True only the reloader child (WERKZEUG_RUN_MAIN) serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warm_up()
     
     print("Starting PDF Chatbot backend with Mistral AI...")
     print("Make sure to set MISTRAL_API_KEY in your .env file for AI features")
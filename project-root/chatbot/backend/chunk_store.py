@@ -0,0 +1,186 @@
+import mmap
+import os
+from array import array
+from collections.abc import Mapping, Sequence
+
+# Serve document text from a memory map of its cache file instead of process memory
+DOCUMENT_TEXT_MMAP = os.getenv('DOCUMENT_TEXT_MMAP', 'false').lower() in ('1', 'true', 'yes')
+
+# Per chunk: start byte, end byte, start character, page number, token count (-1 when unknown)
+SPAN_FIELDS = 5
+
+
+class ChunkStore(Sequence):
+    """A document's text stored once as UTF-8, with every chunk as a span into it.
+
+    Chunk strings are sliced out and decoded when they are read, so neither
+    the overlapping chunk windows nor the vector store's docstore hold a copy
+    of the text. The buffer is bytes or a read-only memory map of the cached
+    text file.
+    """
+
+    def __init__(self, buffer, spans):
+        self._buffer = buffer
+        self.spans = spans
+
+    def __len__(self):
+        return len(self.spans) // SPAN_FIELDS
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        start, end, _char_start, _page, _tokens = self.span(i)
+        return self._buffer[start:end].decode('utf-8')
+
+    def span(self, i):
+        """(start byte, end byte, start character, page, tokens) of chunk i"""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('chunk index out of range')
+        base = i * SPAN_FIELDS
+        return tuple(self.spans[base:base + SPAN_FIELDS])
+
+    def location(self, i):
+        """(page, start, end) of chunk i, as character offsets into the document text"""
+        _start, _end, char_start, page, _tokens = self.span(i)
+        return page, char_start, char_start + len(self[i])
+
+    def tokens(self, i):
+        """Token count of chunk i, or None for stores built without them"""
+        tokens = self.span(i)[4]
+        return tokens if tokens >= 0 else None
+
+    @property
+    def text(self):
+        """The whole document text"""
+        return self._buffer[:].decode('utf-8')
+
+    @property
+    def memory_mapped(self):
+        return isinstance(self._buffer, mmap.mmap)
+
+    def to_bytes(self):
+        return bytes(self._buffer)
+
+    def use_file(self, path):
+        """Serve the text from a read-only memory map of path, which holds the same bytes.
+
+        Returns False, keeping the current buffer, when the file is gone.
+        """
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size:
+                    self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def memory_bytes(self):
+        """Process memory held by the text (none when mapped) and the span table"""
+        text = 0 if self.memory_mapped else len(self._buffer)
+        return text + self.spans.itemsize * len(self.spans)
+
+    def save_spans(self, path):
+        with open(path, 'wb') as f:
+            self.spans.tofile(f)
+
+    @classmethod
+    def load(cls, text_path, spans_path, memory_map=DOCUMENT_TEXT_MMAP):
+        spans = array('q')
+        with open(spans_path, 'rb') as f:
+            spans.frombytes(f.read())
+        if memory_map:
+            store = cls(b'', spans)
+            store.use_file(text_path)
+            return store
+        with open(text_path, 'rb') as f:
+            return cls(f.read(), spans)
+
+
+class ChunkStoreBuilder:
+    """Collects page blocks and the chunks cut from them into a ChunkStore.
+
+    Pages are added in order, and each page's chunks are added right after
+    it. A chunk is located in its page by substring search, so chunkers must
+    return exact slices of the page block.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._offset = 0
+        self._char_offset = 0
+        self._block = ''
+        self._block_start = 0
+        self._block_char_start = 0
+        self._page = 0
+        self._search_from = 0
+        self._spans = array('q')
+
+    def add_page(self, page_num, block):
+        self._block = block
+        self._block_start = self._offset
+        self._block_char_start = self._char_offset
+        self._page = page_num
+        self._search_from = 0
+        data = block.encode('utf-8')
+        self._parts.append(data)
+        self._offset += len(data)
+        self._char_offset += len(block)
+
+    def add_chunk(self, chunk):
+        index = self._block.find(chunk, self._search_from)
+        if index == -1:
+            raise ValueError(f'Chunk is not part of page {self._page}')
+        self._search_from = index + 1
+        prefix = self._block[:index]
+        start = self._block_start + (index if prefix.isascii() else len(prefix.encode('utf-8')))
+        end = start + (len(chunk) if chunk.isascii() else len(chunk.encode('utf-8')))
+        self._spans.extend((start, end, self._block_char_start + index, self._page, -1))
+
+    def build(self, token_counts=None):
+        """The finished store; token_counts gives one count per chunk"""
+        if token_counts is not None:
+            for i, tokens in enumerate(token_counts):
+                self._spans[i * SPAN_FIELDS + 4] = tokens
+        return ChunkStore(b''.join(self._parts), self._spans)
+
+
+class ChunkDocstore:
+    """LangChain docstore that builds each chunk's Document from a ChunkStore when it is read"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def search(self, position):
+        from langchain.docstore.document import Document as LangchainDocument
+
+        position = int(position)
+        if not 0 <= position < len(self.chunks):
+            return f"ID {position} not found."
+        _start, _end, char_start, page, tokens = self.chunks.span(position)
+        text = self.chunks[position]
+        # Offsets let a client show the source passage without searching the text for it
+        metadata = {'chunk': position, 'page': page, 'start': char_start, 'end': char_start + len(text)}
+        if tokens >= 0:
+            metadata['tokens'] = tokens
+        return LangchainDocument(page_content=text, metadata=metadata)
+
+
+class ChunkPositions(Mapping):
+    """index_to_docstore_id for a ChunkDocstore: FAISS row i is chunk i, without a dict entry per row"""
+
+    def __init__(self, size):
+        self.size = size
+
+    def __getitem__(self, i):
+        i = int(i)
+        if not 0 <= i < self.size:
+            raise KeyError(i)
+        return i
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(range(self.size))
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+
+# Chat, summary and upload requests handled at once per process; most of them wait on the LLM
+MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', '200'))
+# Seconds a request may wait for a free slot before it is rejected with 429
+REQUEST_QUEUE_TIMEOUT = float(os.getenv('REQUEST_QUEUE_TIMEOUT', '1'))
+
+
+class ConcurrencyLimiter:
+    """Bounds the number of in-flight requests and sheds load beyond it.
+
+    ``acquire()`` waits at most ``queue_timeout`` seconds for a slot and
+    returns False when the process is saturated, so callers can answer 429
+    instead of piling up threads behind a slow model.
+    """
+
+    def __init__(self, max_active=MAX_CONCURRENT_REQUESTS, queue_timeout=REQUEST_QUEUE_TIMEOUT):
+        self.max_active = max_active
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_active)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.peak_active = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.active += 1
+            self.admitted += 1
+            self.peak_active = max(self.peak_active, self.active)
+        return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_active': self.max_active,
+                'queue_timeout_seconds': self.queue_timeout,
+                'active': self.active,
+                'peak_active': self.peak_active,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+            }
+
+
+class RateLimiter:
+    """Token bucket spacing out calls to an upstream API.
+
+    ``acquire()`` blocks until a call may start: up to ``burst`` calls go
+    through at once, then one per ``1 / rate`` seconds. A rate of 0 disables
+    the limit.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.waited_seconds = 0.0
+
+    def _take(self):
+        """Refill the bucket and take a token; returns 0, or the seconds until one is due"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.calls += 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Wait for a token; returns the seconds spent waiting"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            delay = self._take()
+            if not delay:
+                with self._lock:
+                    self.waited_seconds += waited
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def try_acquire(self):
+        """Take a token only if one is available now; never waits"""
+        return self.rate <= 0 or not self._take()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate_per_second': self.rate,
+                'burst': self.burst,
+                'calls': self.calls,
+                'waited_seconds': round(self.waited_seconds, 3),
+            }
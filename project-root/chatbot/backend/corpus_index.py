@@ -0,0 +1,400 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl (Windows) the backend runs as a single process
+    fcntl = None
+
+from lexical_index import tokenize
+from vector_index import (EMBEDDING_PRECISION, INDEX_MODE, apply_search_params, index_mode, make_index,
+                          read_index, select_index_mode, selection_params)
+
+CORPUS_INDEX_DIR = os.getenv('CORPUS_INDEX_DIR', os.path.join(os.path.dirname(__file__), 'corpus_index'))
+
+INDEX_FILE = 'index.faiss'
+DB_FILE = 'chunks.sqlite3'
+LOCK_FILE = 'index.lock'
+
+
+class CorpusIndex:
+    """Persistent FAISS index over the chunks of every uploaded document.
+
+    Vectors live in an ``IndexIDMap2`` whose ids are the row ids of the chunk
+    table in SQLite, so a document can be added or removed without touching
+    the rest of the corpus. On first use (or during the start-up warm-up) the
+    index file is memory-mapped read-only, which makes the server query-ready
+    without loading every vector into RAM; the first write swaps in a private
+    in-memory copy.
+
+    Several worker processes can share one corpus. Writes hold an exclusive
+    lock on ``index.lock`` and start from the latest saved index, and every
+    search first checks whether another process saved a newer index file and
+    maps that one instead.
+
+    The corpus starts as an exact flat index and is migrated to IVF once it
+    grows past the flat threshold. HNSW is not used here because it cannot
+    remove vectors. IVF indexes take the chunk ids directly rather than
+    through an id map, because FAISS id maps assume removals renumber the
+    wrapped index like a flat index does.
+    """
+
+    def __init__(self, root=CORPUS_INDEX_DIR, precision=EMBEDDING_PRECISION, mode=INDEX_MODE):
+        self.root = root
+        self.precision = precision
+        if mode == 'hnsw':
+            print("HNSW cannot remove vectors; the corpus index uses flat/IVF instead")
+            mode = 'auto'
+        self.mode = mode
+        self.index_path = os.path.join(root, INDEX_FILE)
+        self.db_path = os.path.join(root, DB_FILE)
+        self.lock_path = os.path.join(root, LOCK_FILE)
+        self._lock = threading.RLock()
+        self._index = None
+        self._mmapped = False
+        self._opened = False
+        # (inode, mtime, size) of the index file this process last read or wrote
+        self._signature = None
+        self.load_seconds = None
+        os.makedirs(root, exist_ok=True)
+        self._init_db()
+
+    @contextmanager
+    def _db(self):
+        """SQLite connection that commits on success and is always closed"""
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _init_db(self):
+        with self._db() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('''CREATE TABLE IF NOT EXISTS documents (
+                document_id TEXT PRIMARY KEY,
+                filename TEXT,
+                chunk_count INTEGER,
+                added REAL)''')
+            db.execute('''CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                tokens INTEGER,
+                page INTEGER,
+                start_offset INTEGER,
+                end_offset INTEGER)''')
+            db.execute('CREATE INDEX IF NOT EXISTS chunks_document ON chunks(document_id)')
+            # Corpora created before token counts and chunk locations were stored
+            columns = [row[1] for row in db.execute('PRAGMA table_info(chunks)')]
+            for column in ('tokens', 'page', 'start_offset', 'end_offset'):
+                if column not in columns:
+                    db.execute(f'ALTER TABLE chunks ADD COLUMN {column} INTEGER')
+            # Full-text index over the chunk table for lexical (BM25) search
+            has_fts = db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'").fetchone()
+            try:
+                db.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts
+                    USING fts5(text, content='chunks', content_rowid='id')''')
+                if not has_fts:
+                    db.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+                self.full_text = True
+            except sqlite3.OperationalError as e:
+                print(f"Error creating full-text index, lexical corpus search disabled: {e}")
+                self.full_text = False
+
+    @contextmanager
+    def _write_lock(self):
+        """Exclusive lock across processes for a read-modify-save of the index"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def version(self):
+        """Changes whenever any process saves the index; used to scope cached corpus answers"""
+        signature = self._file_signature()
+        return '-'.join(str(part) for part in signature) if signature else '0'
+
+    def open(self):
+        """Memory-map the persisted index, once; every index operation calls this first"""
+        with self._lock:
+            if not self._opened:
+                self._open_index()
+                self._opened = True
+
+    def _refresh(self):
+        """Map the index again when another process has saved a newer one"""
+        self.open()
+        if self._file_signature() != self._signature:
+            self._open_index()
+
+    def _open_index(self):
+        """Memory-map the persisted index if there is one"""
+        start = time.perf_counter()
+        self._signature = self._file_signature()
+        if self._signature is None:
+            self._index = None
+            self._mmapped = False
+        else:
+            self._index, self._mmapped = read_index(self.index_path)
+            apply_search_params(self._index)
+        self.load_seconds = time.perf_counter() - start
+
+    def _new_index(self, dim, num_vectors):
+        import faiss
+
+        mode = select_index_mode(num_vectors, self.mode, allow_hnsw=False)
+        index = make_index(dim, self.precision, mode, num_vectors)
+        return index if mode == 'ivf' else faiss.IndexIDMap2(index)
+
+    def _writable_index(self, dim, num_vectors=0):
+        """Return an index that can be modified, creating or un-mapping it as needed"""
+        import faiss
+
+        if self._index is None:
+            self._index = self._new_index(dim, num_vectors)
+        elif self._mmapped is not False:
+            # Mapped (or possibly mapped) data is read-only
+            self._index = apply_search_params(faiss.read_index(self.index_path))
+            self._mmapped = False
+        return self._index
+
+    def _maybe_upgrade(self):
+        """Move a flat corpus that outgrew the flat threshold to an IVF index"""
+        import faiss
+
+        index = self._index
+        if index_mode(index) != 'flat' or select_index_mode(index.ntotal, self.mode, allow_hnsw=False) != 'ivf':
+            return
+        ids = faiss.vector_to_array(index.id_map)
+        vectors = index.index.reconstruct_n(0, index.ntotal)
+        upgraded = self._new_index(index.d, len(ids))
+        upgraded.train(vectors)
+        upgraded.add_with_ids(vectors, ids)
+        self._index = upgraded
+        print(f"Corpus index migrated to IVF ({len(ids)} vectors)")
+
+    def _save(self):
+        """Write the index atomically so readers never see a partial file"""
+        import faiss
+
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        faiss.write_index(self._index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+        self._signature = self._file_signature()
+
+    def contains(self, document_id):
+        with self._db() as db:
+            row = db.execute('SELECT 1 FROM documents WHERE document_id = ?', (document_id,)).fetchone()
+        return row is not None
+
+    def add_document(self, document_id, filename, chunks, vectors, chunk_tokens=None, replaces=None,
+                     chunk_locations=None):
+        """Add a document's chunk vectors; a document already present is replaced.
+
+        ``chunk_locations`` gives (page, start, end) per chunk, character
+        offsets into the document text, which search results carry for citations.
+
+        With ``replaces``, that earlier version is removed in the same
+        transaction, so corpus searches see either the old or the new version.
+        """
+        import numpy as np
+
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        chunk_tokens = chunk_tokens or [None] * len(chunks)
+        chunk_locations = chunk_locations or [(None, None, None)] * len(chunks)
+        with self._lock, self._write_lock():
+            self._refresh()
+            index = self._writable_index(vectors.shape[1], len(vectors))
+            with self._db() as db:
+                for old_id in {document_id, replaces} - {None}:
+                    self._remove_chunks(db, old_id)
+                ids = [
+                    db.execute('INSERT INTO chunks (document_id, position, text, tokens, page, start_offset, '
+                               'end_offset) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                               (document_id, position, text, tokens) + tuple(location)).lastrowid
+                    for position, (text, tokens, location) in enumerate(zip(chunks, chunk_tokens, chunk_locations))
+                ]
+                if self.full_text:
+                    db.executemany('INSERT INTO chunks_fts (rowid, text) VALUES (?, ?)', zip(ids, chunks))
+                if not index.is_trained:
+                    index.train(vectors)
+                index.add_with_ids(vectors, np.array(ids, dtype='int64'))
+                db.execute('INSERT INTO documents (document_id, filename, chunk_count, added) VALUES (?, ?, ?, ?)',
+                           (document_id, filename, len(chunks), time.time()))
+                self._maybe_upgrade()
+                self._save()
+        return len(ids)
+
+    def remove_document(self, document_id):
+        """Remove a document's chunks from the index; returns the number removed"""
+        with self._lock, self._write_lock():
+            self._refresh()
+            with self._db() as db:
+                removed = self._remove_chunks(db, document_id)
+                if removed and self._index is not None:
+                    self._save()
+        return removed
+
+    def _remove_chunks(self, db, document_id):
+        """Delete a document's vectors and rows inside the caller's transaction"""
+        import numpy as np
+
+        ids = [row[0] for row in db.execute('SELECT id FROM chunks WHERE document_id = ?', (document_id,))]
+        if ids and self._index is not None:
+            index = self._writable_index(self._index.d)
+            index.remove_ids(np.array(ids, dtype='int64'))
+        if self.full_text:
+            # External-content FTS rows are deleted by repeating their text
+            db.execute("INSERT INTO chunks_fts (chunks_fts, rowid, text) "
+                       "SELECT 'delete', id, text FROM chunks WHERE document_id = ?", (document_id,))
+        db.execute('DELETE FROM chunks WHERE document_id = ?', (document_id,))
+        db.execute('DELETE FROM documents WHERE document_id = ?', (document_id,))
+        return len(ids)
+
+    def documents(self):
+        with self._db() as db:
+            rows = db.execute('SELECT document_id, filename, chunk_count, added FROM documents ORDER BY added')
+            return [
+                {'document_id': row[0], 'filename': row[1], 'chunks_count': row[2], 'added': row[3]}
+                for row in rows
+            ]
+
+    def search_by_vector(self, vector, k=3, document_ids=None):
+        """Return [(LangChain document, distance)] for the nearest chunks, of document_ids only if given"""
+        import numpy as np
+
+        params = None
+        if document_ids:
+            chunk_ids = self._chunk_ids(document_ids)
+            if not chunk_ids:
+                return []
+        # FAISS indexes are not safe to search while another thread modifies them
+        with self._lock:
+            self._refresh()
+            index = self._index
+            if index is None or index.ntotal == 0:
+                return []
+            if document_ids:
+                # The selector must outlive the search that uses it
+                selector, params = selection_params(index, chunk_ids)
+            distances, ids = index.search(np.asarray([vector], dtype='float32'), k, params=params)
+        hits = [(int(i), float(d)) for i, d in zip(ids[0], distances[0]) if i != -1]
+        return self._documents_for_hits(hits)
+
+    def search_text(self, query, k=3, document_ids=None):
+        """Return [(LangChain document, BM25 score)] for the best lexical matches, of document_ids only if given"""
+        terms = tokenize(query)
+        if not self.full_text or not terms:
+            return []
+        # Every term is quoted, so user input cannot inject FTS5 query syntax
+        match = ' OR '.join('"' + term.replace('"', '""') + '"' for term in dict.fromkeys(terms))
+        sql = 'SELECT chunks_fts.rowid, bm25(chunks_fts) FROM chunks_fts'
+        params = [match]
+        if document_ids:
+            sql += (' JOIN chunks c ON c.id = chunks_fts.rowid WHERE chunks_fts MATCH ? '
+                    f'AND c.document_id IN ({",".join("?" * len(document_ids))})')
+            params += list(document_ids)
+        else:
+            sql += ' WHERE chunks_fts MATCH ?'
+        with self._db() as db:
+            hits = db.execute(sql + ' ORDER BY bm25(chunks_fts) LIMIT ?', params + [k]).fetchall()
+        return self._documents_for_hits(hits)
+
+    def _chunk_ids(self, document_ids):
+        """Ids of every chunk of the given documents"""
+        with self._db() as db:
+            return [row[0] for row in db.execute(
+                f'SELECT id FROM chunks WHERE document_id IN ({",".join("?" * len(document_ids))})',
+                list(document_ids))]
+
+    def _documents_for_hits(self, hits):
+        """Resolve ranked (chunk id, score) pairs to LangChain documents, keeping their order"""
+        from langchain.docstore.document import Document as LangchainDocument
+
+        if not hits:
+            return []
+        with self._db() as db:
+            placeholders = ','.join('?' * len(hits))
+            rows = {
+                row[0]: row[1:]
+                for row in db.execute(
+                    f'SELECT c.id, c.document_id, c.position, c.text, c.tokens, c.page, c.start_offset, '
+                    f'c.end_offset, d.filename FROM chunks c '
+                    f'JOIN documents d ON d.document_id = c.document_id WHERE c.id IN ({placeholders})',
+                    [i for i, _score in hits])
+            }
+        results = []
+        for chunk_id, score in hits:
+            if chunk_id not in rows:
+                continue
+            doc_id, position, text, tokens, page, start, end, filename = rows[chunk_id]
+            metadata = {'document_id': doc_id, 'filename': filename, 'chunk': position}
+            if tokens is not None:
+                metadata['tokens'] = tokens
+            # Chunks added before locations were stored cite only the document
+            if page is not None:
+                metadata.update(page=page, start=start, end=end)
+            results.append((LangchainDocument(page_content=text, metadata=metadata), score))
+        return results
+
+    def stats(self):
+        with self._lock:
+            self.open()
+            index = self._index
+        with self._db() as db:
+            document_count = db.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+        return {
+            'documents': document_count,
+            'vectors': index.ntotal if index is not None else 0,
+            'mode': index_mode(index) if index is not None else None,
+            'memory_mapped': self._mmapped,
+            'load_seconds': round(self.load_seconds, 4) if self.load_seconds is not None else None,
+            'precision': self.precision,
+            'full_text': self.full_text,
+        }
+
+
+class CorpusVectorStore:
+    """Adapter giving the corpus the small vector-store surface AIAssistant uses"""
+
+    def __init__(self, corpus, embeddings, document_ids=None):
+        self.corpus = corpus
+        self.embeddings = embeddings
+        self.document_ids = document_ids
+
+    def similarity_search(self, query, k=3):
+        vector = self.embeddings.embed_query(query)
+        return [doc for doc, _distance in self.corpus.search_by_vector(vector, k, self.document_ids)]
+
+    def lexical_search(self, query, k=3):
+        return [doc for doc, _score in self.corpus.search_text(query, k, self.document_ids)]
+
+    def as_retriever(self, search_kwargs=None):
+        from retrievers import CorpusRetriever
+
+        k = (search_kwargs or {}).get('k', 3)
+        return CorpusRetriever(corpus=self.corpus, embeddings=self.embeddings, k=k,
+                               document_ids=self.document_ids)
+
+    def __bool__(self):
+        return self.corpus.stats()['vectors'] > 0
@@ -0,0 +1,332 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from chunk_store import DOCUMENT_TEXT_MMAP, SPAN_FIELDS, ChunkStore
+from vector_index import apply_search_params, faiss_store, read_index
+
+CACHE_MAX_BYTES = int(os.getenv('DOCUMENT_CACHE_MAX_MB', '1024')) * 1024 * 1024
+# Other worker processes write to the same cache; their entries are counted when it is rescanned
+CACHE_RESCAN_INTERVAL = int(os.getenv('DOCUMENT_CACHE_RESCAN_SECONDS', '60'))
+
+TEXT_FILE = 'text.txt'
+SPANS_FILE = 'chunk_spans.bin'
+PAGES_FILE = 'pages.json'
+SUMMARY_FILE = 'summary.txt'
+META_FILE = 'meta.json'
+INDEX_FILE = 'index.faiss'
+# Shared by all worker processes; names starting with '.' are not cache entries
+LATEST_FILE = '.latest'
+ALIASES_DIR = '.aliases'
+
+
+def file_sha256(filepath, block_size=1024 * 1024):
+    """Hash a file's content without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _dir_size(path):
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class DocumentCache:
+    """Content-addressed on-disk cache of extracted text, chunk spans and FAISS indexes.
+
+    Entries live in ``<root>/<key>/`` where the key hashes the PDF content
+    together with the chunking and embedding settings, so changing either
+    setting never serves stale chunks. Entries are written to a temporary
+    directory and renamed into place, and the least recently used entries are
+    evicted once the cache grows past ``max_bytes``. An entry is a document's
+    only stored copy, so ``on_evict(key)`` is called for each evicted entry to
+    drop the document from the library too. With ``memory_map`` the
+    text and FAISS index of loaded entries stay in the page cache rather than
+    process memory, so worker processes share them.
+
+    The cache also records the latest upload and which document replaced
+    which, so every worker process resolves document ids the same way.
+    """
+
+    def __init__(self, root, max_bytes=CACHE_MAX_BYTES, memory_map=DOCUMENT_TEXT_MMAP, on_evict=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.memory_map = memory_map
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Loads whose FAISS vectors are served from the mapped file, shared by all worker processes
+        self.mapped_indexes = 0
+        os.makedirs(self.root, exist_ok=True)
+        # Size of every entry, kept up to date by put, remove and evict instead of walking the cache
+        self._sizes = {}
+        self.total_bytes = 0
+        self._rescan()
+
+    def make_key(self, file_hash, settings):
+        """Combine the content hash with the processing settings"""
+        payload = json.dumps({'file': file_hash, 'settings': settings}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.root, key)
+
+    def contains(self, key):
+        return os.path.exists(os.path.join(self._entry_path(key), META_FILE))
+
+    def text_path(self, key):
+        return os.path.join(self._entry_path(key), TEXT_FILE)
+
+    def get(self, key, embeddings):
+        """Return (chunks, vector_store) for a cached entry, or None.
+
+        Entries written with another span layout, or before chunks were stored
+        as spans, count as misses; the PDF is processed again on its next upload.
+        """
+        path = self._entry_path(key)
+        if (self.get_meta(key) or {}).get('span_fields') != SPAN_FIELDS:
+            self.misses += 1
+            return None
+        try:
+            chunks = ChunkStore.load(self.text_path(key), os.path.join(path, SPANS_FILE), self.memory_map)
+            index, mapped = read_index(os.path.join(path, INDEX_FILE), self.memory_map)
+            index = apply_search_params(index)
+            vector_store = faiss_store(index, embeddings, chunks)
+        except Exception as e:
+            print(f"Error reading document cache entry {key}: {e}")
+            self.misses += 1
+            return None
+        self.touch(key)
+        self.hits += 1
+        if mapped:
+            self.mapped_indexes += 1
+        return chunks, vector_store
+
+    def map_index(self, key, vector_store):
+        """Serve a freshly built store's vectors from the mapped cache file instead of process memory"""
+        try:
+            index, mapped = read_index(os.path.join(self._entry_path(key), INDEX_FILE))
+        except RuntimeError as e:
+            print(f"Error mapping document cache index {key}: {e}")
+            return False
+        if mapped:
+            vector_store.index = apply_search_params(index)
+        return bool(mapped)
+
+    def get_meta(self, key):
+        """Return the metadata stored with an entry, or None"""
+        meta_path = os.path.join(self._entry_path(key), META_FILE)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_pages(self, key):
+        """Return [{'hash', 'start', 'end'}] per page of an entry's text, or None"""
+        try:
+            with open(os.path.join(self._entry_path(key), PAGES_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_summary(self, key):
+        """Return the cached summary for an entry, if one has been stored"""
+        summary_path = os.path.join(self._entry_path(key), SUMMARY_FILE)
+        if not os.path.exists(summary_path):
+            return None
+        with open(summary_path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def put(self, key, chunks, vector_store, meta=None, pages=None):
+        """Store the text and chunk spans of a ChunkStore and the FAISS index for ``key``.
+
+        ``pages`` lists each page's content hash and the span of its text in
+        the document text, so the next revision of the PDF can reuse unchanged pages.
+        """
+        import faiss
+
+        path = self._entry_path(key)
+        tmp_path = os.path.join(self.root, f".tmp-{key}-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(tmp_path)
+            with open(os.path.join(tmp_path, TEXT_FILE), 'wb') as f:
+                f.write(chunks.to_bytes())
+            chunks.save_spans(os.path.join(tmp_path, SPANS_FILE))
+            if pages is not None:
+                with open(os.path.join(tmp_path, PAGES_FILE), 'w', encoding='utf-8') as f:
+                    json.dump(pages, f)
+            faiss.write_index(vector_store.index, os.path.join(tmp_path, INDEX_FILE))
+            # meta.json is written last: its presence marks a complete entry
+            with open(os.path.join(tmp_path, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump(dict(meta or {}, span_fields=SPAN_FIELDS, created=time.time()), f)
+            size = _dir_size(tmp_path)
+            with self._lock:
+                if os.path.exists(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                os.replace(tmp_path, path)
+                self._set_size(key, size)
+        except Exception as e:
+            print(f"Error writing document cache entry {key}: {e}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return False
+        # The new entry is not in the library yet, but is about to be
+        self.evict(spare=key)
+        return True
+
+    def put_summary(self, key, summary):
+        """Attach a generated summary to an existing entry"""
+        path = self._entry_path(key)
+        if not self.contains(key):
+            return False
+        tmp_file = os.path.join(path, f".{SUMMARY_FILE}.{uuid.uuid4().hex}")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(summary)
+        os.replace(tmp_file, os.path.join(path, SUMMARY_FILE))
+        return True
+
+    def remove(self, key):
+        """Delete an entry from disk"""
+        with self._lock:
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+            self._set_size(key, None)
+
+    def _write_small(self, path, content):
+        """Replace a small text file atomically"""
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def _read_small(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def put_latest(self, key):
+        """Record the most recent upload; None clears it"""
+        path = os.path.join(self.root, LATEST_FILE)
+        if key is None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        self._write_small(path, key)
+
+    def get_latest(self):
+        return self._read_small(os.path.join(self.root, LATEST_FILE))
+
+    def put_alias(self, old_key, new_key):
+        """Record that new_key replaced old_key; None records that old_key was deleted"""
+        aliases = os.path.join(self.root, ALIASES_DIR)
+        os.makedirs(aliases, exist_ok=True)
+        self._write_small(os.path.join(aliases, old_key), new_key or '')
+
+    def get_alias(self, key):
+        """The key that replaced key, or None"""
+        return self._read_small(os.path.join(self.root, ALIASES_DIR, key))
+
+    def is_retired(self, key):
+        """True once key has been replaced or deleted, by this or any other process"""
+        return os.path.exists(os.path.join(self.root, ALIASES_DIR, key))
+
+    def remove_alias(self, key):
+        """Forget that key was retired, when the same document is uploaded again"""
+        try:
+            os.remove(os.path.join(self.root, ALIASES_DIR, key))
+        except FileNotFoundError:
+            pass
+
+    def touch(self, key):
+        """Mark an entry as recently used"""
+        try:
+            os.utime(self._entry_path(key), None)
+        except OSError:
+            pass
+
+    def _set_size(self, key, size):
+        """Record an entry's size; None forgets the entry"""
+        self.total_bytes -= self._sizes.pop(key, 0)
+        if size is not None:
+            self._sizes[key] = size
+            self.total_bytes += size
+
+    def _rescan(self):
+        """Rebuild the entry sizes from disk"""
+        self._sizes = {key: size for _mtime, size, key in self.entries()}
+        self.total_bytes = sum(self._sizes.values())
+        self._scanned_at = time.time()
+
+    def entries(self):
+        """List (mtime, size, key) for complete entries, oldest first, by walking the cache directory"""
+        result = []
+        for name in os.listdir(self.root):
+            path = self._entry_path(name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            try:
+                result.append((os.path.getmtime(path), _dir_size(path), name))
+            except OSError:
+                continue
+        result.sort()
+        return result
+
+    def evict(self, spare=None):
+        """Drop least recently used entries, except ``spare``, until the cache fits in max_bytes"""
+        evicted = []
+        with self._lock:
+            if time.time() - self._scanned_at > CACHE_RESCAN_INTERVAL:
+                self._rescan()
+            if self.total_bytes > self.max_bytes:
+                # Only the recency order is read from disk, and only when something has to go
+                by_age = []
+                for key in list(self._sizes):
+                    try:
+                        by_age.append((os.path.getmtime(self._entry_path(key)), key))
+                    except OSError:
+                        # Removed by another worker process
+                        self._set_size(key, None)
+                for _mtime, key in sorted(by_age):
+                    if self.total_bytes <= self.max_bytes:
+                        break
+                    if key == spare:
+                        continue
+                    shutil.rmtree(self._entry_path(key), ignore_errors=True)
+                    self._set_size(key, None)
+                    evicted.append(key)
+            total = self.total_bytes
+        if self.on_evict is not None:
+            for key in evicted:
+                try:
+                    self.on_evict(key)
+                except Exception as e:
+                    print(f"Error evicting document {key}: {e}")
+        return total
+
+    def stats(self):
+        """Hit/miss counters and disk usage for /status"""
+        return {
+            'entries': len(self._sizes),
+            'size_mb': round(self.total_bytes / (1024 * 1024), 2),
+            'max_mb': round(self.max_bytes / (1024 * 1024), 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'mapped_indexes': self.mapped_indexes,
+        }
@@ -0,0 +1,214 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from lexical_index import BM25Index
+
+REGISTRY_MAX_DOCUMENTS = int(os.getenv('REGISTRY_MAX_DOCUMENTS', '32'))
+REGISTRY_MAX_MB = int(os.getenv('REGISTRY_MAX_MB', '1024'))
+# How often a document in use marks its cache entry as recently used
+CACHE_TOUCH_INTERVAL = 60
+
+DOCUMENT_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def is_valid_document_id(document_id):
+    return bool(document_id) and bool(DOCUMENT_ID_PATTERN.match(document_id))
+
+
+class Document:
+    """A processed PDF: its chunk store (text and chunk spans), vector store and lexical index"""
+
+    def __init__(self, document_id, filename, chunks, vector_store, summary=None):
+        self.document_id = document_id
+        self.filename = filename
+        self.chunks = chunks
+        self.vector_store = vector_store
+        # Rebuilt from the chunks on reload; tokenizing is far cheaper than storing it
+        self.lexical_index = BM25Index(chunks)
+        self.summary = summary
+        self.summary_lock = threading.Lock()
+        # SharedStream of a summary being streamed, which later /summary?stream=1 calls join
+        self.summary_stream = None
+        self.loaded_at = time.time()
+        self.touched_at = self.loaded_at
+
+    @property
+    def text(self):
+        """The full extracted text, decoded from the chunk store on each access"""
+        return self.chunks.text
+
+    def memory_bytes(self):
+        """Rough in-memory footprint of the text, chunk spans and index vectors"""
+        size = self.chunks.memory_bytes()
+        index = getattr(self.vector_store, 'index', None)
+        if index is not None:
+            size += index.ntotal * index.d * 4
+        return size + self.lexical_index.memory_bytes()
+
+    def lexical_search(self, query, k):
+        """Chunks ranked by BM25, as the vector store's LangChain documents"""
+        store = self.vector_store
+        return [store.docstore.search(store.index_to_docstore_id[position])
+                for position, _score in self.lexical_index.search(query, k)]
+
+    def to_dict(self):
+        return {
+            'document_id': self.document_id,
+            'filename': self.filename,
+            'chunks_count': len(self.chunks),
+            'vector_store_ready': bool(self.vector_store),
+        }
+
+
+class DocumentRegistry:
+    """Memory-bounded LRU of loaded documents backed by the on-disk cache.
+
+    Documents are identified by their cache key, so a document evicted from
+    memory (or loaded by another worker process) is transparently reloaded
+    from ``DocumentCache`` on the next request. The latest upload and replaced
+    versions are recorded in the cache too, and a loaded document that another
+    worker deleted or replaced is dropped, so all worker processes answer for
+    the same documents.
+    """
+
+    def __init__(self, cache, embeddings_provider, max_documents=REGISTRY_MAX_DOCUMENTS,
+                 max_bytes=REGISTRY_MAX_MB * 1024 * 1024):
+        self.cache = cache
+        self.embeddings_provider = embeddings_provider
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self.latest_id = None
+        # Ids of replaced versions -> id of the version that replaced them
+        self._replaced = {}
+        self.reloads = 0
+        self.evictions = 0
+
+    def add(self, document):
+        """Register a freshly processed document and make it the latest"""
+        with self._lock:
+            self._documents[document.document_id] = document
+            self._documents.move_to_end(document.document_id)
+            self.latest_id = document.document_id
+            self._evict()
+        self.cache.remove_alias(document.document_id)
+        self.cache.put_latest(document.document_id)
+        return document
+
+    def replace(self, old_id, document):
+        """Register a new version of a document in one step.
+
+        The old version is dropped and its id resolves to the new version, so
+        requests see either the old or the new document, never neither.
+        """
+        with self._lock:
+            self._documents.pop(old_id, None)
+            self._documents[document.document_id] = document
+            self._documents.move_to_end(document.document_id)
+            for replaced_id, current_id in self._replaced.items():
+                if current_id == old_id:
+                    self._replaced[replaced_id] = document.document_id
+            self._replaced[old_id] = document.document_id
+            self._replaced.pop(document.document_id, None)
+            self.latest_id = document.document_id
+            self._evict()
+        self.cache.put_alias(old_id, document.document_id)
+        self.cache.remove_alias(document.document_id)
+        self.cache.put_latest(document.document_id)
+        return document
+
+    def resolve(self, document_id=None):
+        """The id a request refers to: the latest upload when omitted, following replacements"""
+        document_id = document_id or self.cache.get_latest() or self.latest_id
+        document_id = self._replaced.get(document_id, document_id)
+        # Replacements made by other worker processes; bounded in case of a cycle
+        for _hop in range(16):
+            if not is_valid_document_id(document_id) or self.cache.contains(document_id):
+                break
+            replacement = self.cache.get_alias(document_id)
+            if not replacement:
+                break
+            document_id = replacement
+        return document_id
+
+    def get(self, document_id=None):
+        """Return a document by id (or the latest upload), reloading it from disk if needed"""
+        document_id = self.resolve(document_id)
+        if not is_valid_document_id(document_id):
+            return None
+        with self._lock:
+            document = self._documents.get(document_id)
+            if document is not None and self.cache.is_retired(document_id):
+                # Deleted or replaced by another worker process
+                del self._documents[document_id]
+                document = None
+            if document is not None:
+                self._documents.move_to_end(document_id)
+                touch = time.time() - document.touched_at > CACHE_TOUCH_INTERVAL
+                if touch:
+                    document.touched_at = time.time()
+        if document is not None:
+            # Keeps documents in use from being evicted from the cache, and with it the library
+            if touch:
+                self.cache.touch(document_id)
+            return document
+        document = self._load(document_id)
+        if document is None:
+            return None
+        with self._lock:
+            # Another thread may have loaded it meanwhile; keep the first copy
+            existing = self._documents.get(document_id)
+            if existing is not None:
+                self._documents.move_to_end(document_id)
+                return existing
+            self._documents[document_id] = document
+            self.reloads += 1
+            self._evict()
+        return document
+
+    def remove(self, document_id):
+        """Forget a loaded document"""
+        with self._lock:
+            self._documents.pop(document_id, None)
+            self._replaced = {old_id: current_id for old_id, current_id in self._replaced.items()
+                              if current_id != document_id}
+            if self.latest_id == document_id:
+                self.latest_id = next(reversed(self._documents), None)
+            if self.cache.get_latest() == document_id:
+                self.cache.put_latest(self.latest_id)
+        if not self.cache.get_alias(document_id):
+            self.cache.put_alias(document_id, None)
+
+    def _load(self, document_id):
+        cached = self.cache.get(document_id, self.embeddings_provider())
+        if not cached:
+            return None
+        chunks, vector_store = cached
+        meta = self.cache.get_meta(document_id) or {}
+        return Document(document_id, meta.get('filename', ''), chunks, vector_store,
+                        summary=self.cache.get_summary(document_id))
+
+    def _evict(self):
+        """Drop least recently used documents; the most recent one always stays"""
+        total = sum(document.memory_bytes() for document in self._documents.values())
+        while len(self._documents) > 1 and (
+                len(self._documents) > self.max_documents or total > self.max_bytes):
+            _document_id, document = self._documents.popitem(last=False)
+            total -= document.memory_bytes()
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            documents = list(self._documents.values())
+        return {
+            'loaded_documents': len(documents),
+            'memory_mb': round(sum(d.memory_bytes() for d in documents) / (1024 * 1024), 2),
+            'max_documents': self.max_documents,
+            'max_mb': round(self.max_bytes / (1024 * 1024), 2),
+            'reloads': self.reloads,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+
+
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'sentence-transformers/all-MiniLM-L6-v2')
+EMBEDDING_DEVICE = os.getenv('EMBEDDING_DEVICE', 'cpu')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+# 0 leaves torch's default intra-op thread count
+EMBEDDING_TORCH_THREADS = int(os.getenv('EMBEDDING_TORCH_THREADS', '0'))
+# Worker processes for sharding very large chunk lists; 0 disables sharding
+EMBEDDING_PROCESSES = int(os.getenv('EMBEDDING_PROCESSES', '0'))
+EMBEDDING_SHARD_MIN_CHUNKS = int(os.getenv('EMBEDDING_SHARD_MIN_CHUNKS', '2000'))
+
+
+def _rss_mb():
+    """Current resident set size of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is in KB on Linux; good enough as a fallback
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class EmbeddingService:
+    """Process-wide embedding model, loaded once and shared by all requests.
+
+    Loading is guarded by a lock so concurrent first requests only build the
+    model once. Encoding itself runs under torch inference and is safe to call
+    from several request threads at the same time.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, device=EMBEDDING_DEVICE,
+                 batch_size=EMBEDDING_BATCH_SIZE, torch_threads=EMBEDDING_TORCH_THREADS,
+                 processes=EMBEDDING_PROCESSES, shard_min_chunks=EMBEDDING_SHARD_MIN_CHUNKS):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self.torch_threads = torch_threads
+        self.processes = processes
+        self.shard_min_chunks = shard_min_chunks
+        self._embeddings = None
+        self._process_pool = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.load_seconds = None
+        self.memory_mb = None
+        self.error = None
+        self.chunks_embedded = 0
+        self.embedding_seconds = 0.0
+        self.last_run = None
+
+    @property
+    def is_loaded(self):
+        return self._embeddings is not None
+
+    def get(self):
+        """Return the shared embeddings object, loading the model on first use"""
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._load()
+        return self._embeddings
+
+    def _load(self):
+        """Build the HuggingFace embeddings and record load time and memory"""
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        try:
+            # Imported here: sentence-transformers and torch take seconds to import
+            from langchain.embeddings import HuggingFaceEmbeddings
+
+            if self.torch_threads > 0:
+                import torch
+                torch.set_num_threads(self.torch_threads)
+            embeddings = HuggingFaceEmbeddings(
+                model_name=self.model_name,
+                model_kwargs={'device': self.device},
+                encode_kwargs={'batch_size': self.batch_size}
+            )
+        except Exception as e:
+            self.error = str(e)
+            raise
+        self.load_seconds = time.perf_counter() - start
+        self.memory_mb = max(_rss_mb() - rss_before, 0.0)
+        self.error = None
+        self._embeddings = embeddings
+        print(f"Loaded embedding model {self.model_name} in {self.load_seconds:.2f}s "
+              f"(+{self.memory_mb:.0f} MB)")
+
+    def _get_process_pool(self):
+        """sentence-transformers worker pool for sharded encoding, started on first use"""
+        model = self.get().client
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = model.start_multi_process_pool(
+                    target_devices=[self.device] * self.processes)
+            return self._process_pool
+
+    def embed_documents(self, texts, progress=None):
+        """Encode texts in explicit batches and return (float32 matrix, run stats).
+
+        progress(done, total) is called after every group of batches. Chunk
+        lists of at least shard_min_chunks are sharded across worker processes
+        when ``processes`` is set.
+        """
+        import numpy as np
+
+        model = self.get().client
+        start = time.perf_counter()
+        sharded = self.processes > 1 and len(texts) >= self.shard_min_chunks
+        if sharded:
+            vectors = model.encode_multi_process(texts, self._get_process_pool(), batch_size=self.batch_size)
+            if progress:
+                progress(len(texts), len(texts))
+        else:
+            parts = []
+            # Several batches per encode call keeps progress updates cheap
+            group = self.batch_size * 4
+            for offset in range(0, len(texts), group):
+                parts.append(model.encode(texts[offset:offset + group], batch_size=self.batch_size,
+                                          convert_to_numpy=True, show_progress_bar=False))
+                if progress:
+                    progress(min(offset + group, len(texts)), len(texts))
+            vectors = np.vstack(parts) if parts else np.zeros((0, 0), dtype='float32')
+        seconds = time.perf_counter() - start
+
+        run = {
+            'chunks': len(texts),
+            'seconds': round(seconds, 3),
+            'chunks_per_second': round(len(texts) / seconds, 1) if seconds > 0 else None,
+            'batch_size': self.batch_size,
+            'processes': self.processes if sharded else 1,
+        }
+        with self._stats_lock:
+            self.chunks_embedded += len(texts)
+            self.embedding_seconds += seconds
+            self.last_run = run
+        return np.asarray(vectors, dtype='float32'), run
+
+    def embed_queries(self, texts):
+        """Encode several queries in one batched call; row i equals embed_query(texts[i])"""
+        import numpy as np
+
+        return np.asarray(self.get().embed_documents(list(texts)), dtype='float32')
+
+    def warm_up(self):
+        """Load the model and run one tiny encode so the first upload is fast"""
+        try:
+            self.get().embed_query("warm up")
+        except Exception as e:
+            print(f"Error warming up embedding model: {e}")
+
+    def stats(self):
+        """Summary of the model state for /status"""
+        return {
+            'model': self.model_name,
+            'device': self.device,
+            'loaded': self.is_loaded,
+            'load_seconds': round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            'memory_mb': round(self.memory_mb, 1) if self.memory_mb is not None else None,
+            'error': self.error,
+            'batch_size': self.batch_size,
+            'torch_threads': self.torch_threads or None,
+            'processes': self.processes,
+            'chunks_embedded': self.chunks_embedded,
+            'chunks_per_second': (round(self.chunks_embedded / self.embedding_seconds, 1)
+                                  if self.embedding_seconds > 0 else None),
+            'last_run': self.last_run,
+        }
+
+
+# Shared instance used by the Flask app
+embedding_service = EmbeddingService()
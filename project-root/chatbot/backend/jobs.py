@@ -0,0 +1,212 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '2'))
+UPLOAD_QUEUE_SIZE = int(os.getenv('UPLOAD_QUEUE_SIZE', '16'))
+JOB_HISTORY_SIZE = int(os.getenv('JOB_HISTORY_SIZE', '200'))
+# Seconds between progress snapshots written for other worker processes
+JOB_STATE_INTERVAL = float(os.getenv('JOB_STATE_INTERVAL', '0.5'))
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class QueueFullError(Exception):
+    """Raised when the upload queue cannot take another job"""
+
+
+class Job:
+    """Progress of one upload through the processing pipeline"""
+
+    def __init__(self, filename):
+        self.job_id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = 'queued'
+        self.stage = None
+        self.stages = []
+        self.pages_total = 0
+        self.pages_processed = 0
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.document_id = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.future = None
+        # Where snapshots are written so any worker process can answer /jobs/<job_id>
+        self.state_path = None
+        self._saved = 0.0
+        self._lock = threading.Lock()
+
+    def save(self, force=True):
+        """Write a snapshot to state_path; progress updates are throttled to JOB_STATE_INTERVAL"""
+        if self.state_path is None or (not force and time.time() - self._saved < JOB_STATE_INTERVAL):
+            return
+        self._saved = time.time()
+        tmp_path = f"{self.state_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp_path, self.state_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error saving job {self.job_id}: {e}")
+
+    def start_stage(self, name):
+        """Close the running stage (if any) and start timing ``name``"""
+        with self._lock:
+            self._finish_stage()
+            self.status = 'running'
+            self.stage = name
+            self.stages.append({'name': name, 'started': time.time(), 'elapsed': None})
+        self.save()
+
+    def _finish_stage(self):
+        if self.stages and self.stages[-1]['elapsed'] is None:
+            self.stages[-1]['elapsed'] = time.time() - self.stages[-1]['started']
+
+    def update(self, **progress):
+        """Set progress counters such as pages_processed or chunks_embedded"""
+        with self._lock:
+            for key, value in progress.items():
+                setattr(self, key, value)
+        self.save(force=False)
+
+    def complete(self, result):
+        with self._lock:
+            self._finish_stage()
+            self.status = 'completed'
+            self.stage = None
+            self.result = result
+            self.finished = time.time()
+        self.save()
+
+    def fail(self, error):
+        with self._lock:
+            self._finish_stage()
+            self.status = 'failed'
+            self.error = error
+            self.finished = time.time()
+        self.save()
+
+    @property
+    def done(self):
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self):
+        with self._lock:
+            now = self.finished or time.time()
+            return {
+                'job_id': self.job_id,
+                'filename': self.filename,
+                'status': self.status,
+                'stage': self.stage,
+                'pages_total': self.pages_total,
+                'pages_processed': self.pages_processed,
+                'chunks_total': self.chunks_total,
+                'chunks_embedded': self.chunks_embedded,
+                'document_id': self.document_id,
+                'stages': [
+                    {
+                        'name': stage['name'],
+                        'elapsed': round(stage['elapsed'] if stage['elapsed'] is not None
+                                         else time.time() - stage['started'], 3),
+                        'done': stage['elapsed'] is not None,
+                    }
+                    for stage in self.stages
+                ],
+                'elapsed': round(now - self.created, 3),
+                'result': self.result,
+                'error': self.error,
+            }
+
+
+class JobManager:
+    """Bounded worker pool that runs upload pipelines in the background.
+
+    With a ``state_dir``, every job's progress is also written there, so a
+    worker process other than the one running the upload can report it.
+    """
+
+    def __init__(self, max_workers=UPLOAD_WORKERS, max_pending=UPLOAD_QUEUE_SIZE,
+                 history_size=JOB_HISTORY_SIZE, state_dir=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.history_size = history_size
+        self.state_dir = state_dir
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, job, fn, *args, **kwargs):
+        """Queue ``fn(job, *args, **kwargs)``; raises QueueFullError when saturated"""
+        with self._lock:
+            if sum(1 for existing in self._jobs.values() if not existing.done) >= self.max_pending:
+                raise QueueFullError('Upload queue is full, please retry shortly')
+            self._jobs[job.job_id] = job
+            self._trim()
+            if self.state_dir:
+                job.state_path = self._state_path(job.job_id)
+                job.save()
+            job.future = self._executor.submit(self._run, job, fn, *args, **kwargs)
+        return job
+
+    def _run(self, job, fn, *args, **kwargs):
+        try:
+            fn(job, *args, **kwargs)
+        except Exception as e:
+            print(f"Error in job {job.job_id}: {e}")
+            job.fail(str(e))
+        if not job.done:
+            job.fail('Job finished without a result')
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond history_size"""
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.history_size:
+                break
+            if self._jobs[job_id].done:
+                job = self._jobs.pop(job_id)
+                if job.state_path:
+                    try:
+                        os.remove(job.state_path)
+                    except OSError:
+                        pass
+
+    def _state_path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job_id):
+        """Progress of a job run by this process, or the last snapshot written by another one"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if not self.state_dir or not JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        try:
+            with open(self._state_path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            'workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'pending': sum(1 for job in jobs if not job.done),
+            'completed': sum(1 for job in jobs if job.status == 'completed'),
+            'failed': sum(1 for job in jobs if job.status == 'failed'),
+        }
@@ -0,0 +1,96 @@
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+# hybrid fuses BM25 with vector search; dense is vector search only
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid')
+# Candidates taken from each ranking per requested chunk before fusion
+HYBRID_CANDIDATES_PER_K = int(os.getenv('HYBRID_CANDIDATES_PER_K', '4'))
+RRF_K = int(os.getenv('RRF_K', '60'))
+BM25_K1 = float(os.getenv('BM25_K1', '1.5'))
+BM25_B = float(os.getenv('BM25_B', '0.75'))
+
+# Question words carry no lexical signal and would otherwise match almost every chunk
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it its me of on or that the this to
+was what when where which who why will with you your about explain describe tell mean means
+""".split())
+
+TOKEN_PATTERN = re.compile(r'\w+(?:[-./]\w+)*')
+
+
+def tokenize(text):
+    """Lowercase terms without stopwords; compounds like 'cs-101' also yield their parts"""
+    terms = []
+    for match in TOKEN_PATTERN.findall(text.lower()):
+        parts = re.split(r'[-./]', match)
+        if len(parts) > 1:
+            terms.append(match)
+        terms.extend(part for part in parts if part and part not in STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """In-memory inverted index over a document's chunks, scored with Okapi BM25.
+
+    Postings are numpy arrays per term, so a query touches only the chunks
+    that contain one of its terms.
+    """
+
+    def __init__(self, texts, k1=BM25_K1, b=BM25_B):
+        import numpy as np
+
+        postings = defaultdict(lambda: ([], []))
+        lengths = np.zeros(len(texts), dtype='float32')
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[position] = sum(counts.values())
+            for term, count in counts.items():
+                positions, term_counts = postings[term]
+                positions.append(position)
+                term_counts.append(count)
+
+        self.size = len(texts)
+        self.k1 = k1
+        average_length = float(lengths.mean()) if self.size and lengths.any() else 1.0
+        # Per-chunk length normalisation, precomputed once
+        self._norms = k1 * (1 - b + b * lengths / average_length)
+        self._postings = {}
+        self._idf = {}
+        for term, (positions, term_counts) in postings.items():
+            self._postings[term] = (np.array(positions, dtype='int32'), np.array(term_counts, dtype='float32'))
+            self._idf[term] = math.log(1 + (self.size - len(positions) + 0.5) / (len(positions) + 0.5))
+
+    def search(self, query, k):
+        """Return [(chunk position, score)] of the k best matching chunks"""
+        import numpy as np
+
+        terms = [term for term in set(tokenize(query)) if term in self._postings]
+        if not terms:
+            return []
+        scores = np.zeros(self.size, dtype='float32')
+        for term in terms:
+            positions, counts = self._postings[term]
+            scores[positions] += self._idf[term] * counts * (self.k1 + 1) / (counts + self._norms[positions])
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind='stable')]
+        return [(int(position), float(scores[position])) for position in matched]
+
+    def memory_bytes(self):
+        return sum(positions.nbytes + counts.nbytes for positions, counts in self._postings.values())
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    """Merge ranked lists of LangChain documents; a chunk scores sum(1 / (rrf_k + rank))"""
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = (doc.metadata.get('document_id'), doc.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            documents.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
@@ -0,0 +1,362 @@
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from concurrency import RateLimiter
+from metrics import metrics
+from tokenizer import count_tokens
+
+# mistral calls the Mistral API; fake answers in-process for offline load tests
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'mistral')
+LLM_MODEL = os.getenv('LLM_MODEL', 'mistral-small-latest')
+# Deadline of a whole call in seconds, retries included
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', os.getenv('MISTRAL_TIMEOUT', '120')))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', os.getenv('MISTRAL_MAX_RETRIES', '3')))
+# Retry delays grow exponentially from the base up to the maximum, with full jitter
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '0.5'))
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '8'))
+# Seconds after which a blocking call still unanswered is sent a second time (0 disables)
+LLM_HEDGE_AFTER = float(os.getenv('LLM_HEDGE_AFTER', '0'))
+# Calls started per second by this process (0 = unlimited) and the burst allowed above it
+LLM_RATE_PER_SECOND = float(os.getenv('LLM_RATE_PER_SECOND', '0'))
+LLM_RATE_BURST = int(os.getenv('LLM_RATE_BURST', '10'))
+# Upstream calls in flight per process; calls beyond it wait within their deadline
+LLM_MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', '64'))
+
+FAKE_LLM_FIRST_TOKEN_DELAY = float(os.getenv('FAKE_LLM_FIRST_TOKEN_DELAY', '0.2'))
+FAKE_LLM_TOKEN_DELAY = float(os.getenv('FAKE_LLM_TOKEN_DELAY', '0.02'))
+FAKE_LLM_REPLY = ("This is a canned answer from the local fake model. "
+                  "It echoes part of the prompt so responses differ between prompts.")
+
+# Statuses worth another attempt: timeouts, conflicts, rate limiting and server errors
+RETRYABLE_STATUS = frozenset((408, 409, 429, 500, 502, 503, 504))
+
+
+class LLMError(Exception):
+    """An LLM call failed, after any retries"""
+
+
+class LLMTimeout(LLMError):
+    """An LLM call did not finish before its deadline"""
+
+
+def is_retryable(error):
+    """Transient failures: retryable HTTP statuses, and errors without a status such as dropped connections"""
+    status = getattr(error, 'http_status', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return not isinstance(error, (TypeError, ValueError, AttributeError, KeyError, LLMError))
+
+
+class MistralBackend:
+    """Mistral chat completions through the official client.
+
+    The client's own retries are off; the gateway retries within the call's
+    deadline instead.
+    """
+
+    name = 'mistral'
+
+    def __init__(self, api_key, endpoint=None, timeout=LLM_TIMEOUT):
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self):
+        return bool(self.api_key)
+
+    def client(self):
+        """Shared Mistral client (and its HTTP connection pool), created on first use"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from mistralai.client import MistralClient
+                    kwargs = {'endpoint': self.endpoint} if self.endpoint else {}
+                    self._client = MistralClient(api_key=self.api_key, max_retries=0, timeout=int(self.timeout),
+                                                 **kwargs)
+        return self._client
+
+    def warm_up(self):
+        if self.configured:
+            self.client()
+
+    def _messages(self, prompt):
+        from mistralai.models.chat_completion import ChatMessage
+        return [ChatMessage(role="user", content=prompt)]
+
+    def complete(self, prompt, model, max_tokens, temperature):
+        """Return (text, (prompt tokens, completion tokens) or None)"""
+        response = self.client().chat(model=model, messages=self._messages(prompt), max_tokens=max_tokens,
+                                      temperature=temperature)
+        usage = response.usage
+        return response.choices[0].message.content, (usage.prompt_tokens, usage.completion_tokens) if usage else None
+
+    def stream(self, prompt, model, max_tokens, temperature):
+        for chunk in self.client().chat_stream(model=model, messages=self._messages(prompt), max_tokens=max_tokens,
+                                               temperature=temperature):
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if content:
+                yield content
+
+
+class FakeBackend:
+    """In-process stand-in model for offline load tests.
+
+    Replies are derived from the prompt, so they differ between questions,
+    and arrive after a fixed first-token delay plus a delay per token, like
+    the standalone fake_mistral.py server but without HTTP.
+    """
+
+    name = 'fake'
+    configured = True
+
+    def __init__(self, first_token_delay=FAKE_LLM_FIRST_TOKEN_DELAY, token_delay=FAKE_LLM_TOKEN_DELAY,
+                 reply=FAKE_LLM_REPLY):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.reply = reply
+
+    def warm_up(self):
+        pass
+
+    def _tokens(self, prompt, max_tokens):
+        words = prompt.split()
+        reply = f"{self.reply} Prompt had {len(words)} words ending with: {' '.join(words[-8:])}"
+        return [word + ' ' for word in reply.split()][:max_tokens], len(words)
+
+    def complete(self, prompt, model, max_tokens, temperature):
+        tokens, prompt_words = self._tokens(prompt, max_tokens)
+        time.sleep(self.first_token_delay + self.token_delay * max(len(tokens) - 1, 0))
+        return ''.join(tokens).strip(), (prompt_words, len(tokens))
+
+    def stream(self, prompt, model, max_tokens, temperature):
+        tokens, _prompt_words = self._tokens(prompt, max_tokens)
+        time.sleep(self.first_token_delay)
+        for index, token in enumerate(tokens):
+            if index:
+                time.sleep(self.token_delay)
+            yield token
+
+
+def make_backend(name=LLM_BACKEND, api_key=None, endpoint=None):
+    if name == 'fake':
+        return FakeBackend()
+    if name != 'mistral':
+        print(f"Unknown LLM_BACKEND {name!r}, using mistral")
+    return MistralBackend(api_key, endpoint)
+
+
+class LLMGateway:
+    """The one path from the app to the model: deadlines, retries, hedging, rate limiting and accounting.
+
+    Every call gets a deadline covering all of its attempts. Transient
+    failures are retried with exponential backoff and full jitter while time
+    remains. A blocking call still unanswered after ``hedge_after`` seconds is
+    sent once more and the first reply wins, which trims the latency tail at
+    the cost of a few duplicate calls. Streams are retried only until their
+    first piece arrives. Upstream calls run on a bounded pool, so a hung
+    connection costs a pool thread rather than a request thread past its
+    deadline.
+    """
+
+    def __init__(self, backend, model=LLM_MODEL, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES,
+                 hedge_after=LLM_HEDGE_AFTER, rate_limiter=None, max_in_flight=LLM_MAX_IN_FLIGHT,
+                 retry_base_delay=LLM_RETRY_BASE_DELAY, retry_max_delay=LLM_RETRY_MAX_DELAY):
+        self.backend = backend
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge_after = hedge_after
+        self.rate_limiter = rate_limiter or RateLimiter(LLM_RATE_PER_SECOND, burst=LLM_RATE_BURST)
+        self.max_in_flight = max_in_flight
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='llm')
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def configured(self):
+        return self.backend.configured
+
+    def complete(self, prompt, max_tokens, temperature, purpose='answer', timeout=None):
+        """Blocking completion of prompt; raises LLMError once retries or the deadline run out"""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                text, usage = self._complete_once(prompt, max_tokens, temperature, deadline)
+                break
+            except Exception as e:
+                self._retry_or_raise(e, attempt, deadline, purpose)
+                attempt += 1
+        self._record(purpose, time.perf_counter() - start, usage, prompt, text)
+        return text
+
+    def stream(self, prompt, max_tokens, temperature, purpose='answer', timeout=None):
+        """Yield the completion piece by piece; the deadline covers the whole stream"""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        start = time.perf_counter()
+        attempt = 0
+        pieces = []
+        while True:
+            try:
+                for piece in self._stream_once(prompt, max_tokens, temperature, deadline):
+                    pieces.append(piece)
+                    yield piece
+                break
+            except Exception as e:
+                if pieces:
+                    # Part of the answer has been sent already; starting over would repeat it
+                    self._fail(e, purpose)
+                self._retry_or_raise(e, attempt, deadline, purpose)
+                attempt += 1
+        self._record(purpose, time.perf_counter() - start, None, prompt, ''.join(pieces))
+
+    def _complete_once(self, prompt, max_tokens, temperature, deadline):
+        """One attempt, hedged when it is slow; returns the first successful (text, usage)"""
+        self._wait_for_rate_limit(deadline)
+        args = (prompt, self.model, max_tokens, temperature)
+        primary = self._pool.submit(self.backend.complete, *args)
+        pending = {primary}
+        hedge_at = time.monotonic() + self.hedge_after if self.hedge_after > 0 else None
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                raise LLMTimeout("LLM call missed its deadline")
+            until = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, pending = wait(pending, timeout=until - now, return_when=FIRST_COMPLETED)
+            error = None
+            # Both copies can finish in the same wait; any success beats a failure
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                if future is not primary:
+                    with self._lock:
+                        self.hedge_wins += 1
+                    metrics.count('llm_hedge_won')
+                return future.result()
+            if error is not None and not pending:
+                raise error
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                hedge_at = None
+                # A hedge is only worth sending if it does not have to queue for the rate limit
+                if self.rate_limiter.try_acquire():
+                    pending.add(self._pool.submit(self.backend.complete, *args))
+                    with self._lock:
+                        self.hedges += 1
+                    metrics.count('llm_hedge')
+
+    def _stream_once(self, prompt, max_tokens, temperature, deadline):
+        """One streaming attempt; the backend is read on a pool thread so the deadline holds between pieces"""
+        self._wait_for_rate_limit(deadline)
+        pieces = queue.Queue()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for piece in self.backend.stream(prompt, self.model, max_tokens, temperature):
+                    if stop.is_set():
+                        return
+                    pieces.put(('piece', piece))
+                pieces.put(('done', None))
+            except Exception as e:
+                pieces.put(('error', e))
+
+        self._pool.submit(produce)
+        try:
+            while True:
+                try:
+                    kind, value = pieces.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    raise LLMTimeout("LLM stream missed its deadline")
+                if kind == 'piece':
+                    yield value
+                elif kind == 'error':
+                    raise value
+                else:
+                    return
+        finally:
+            stop.set()
+
+    def _wait_for_rate_limit(self, deadline):
+        if self.rate_limiter.acquire() and time.monotonic() >= deadline:
+            raise LLMTimeout("LLM call spent its deadline waiting for the rate limit")
+
+    def _retry_or_raise(self, error, attempt, deadline, purpose):
+        """Sleep before the next attempt, or record the failure and raise"""
+        if attempt < self.max_retries and is_retryable(error):
+            delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+            if time.monotonic() + delay < deadline:
+                with self._lock:
+                    self.retries += 1
+                metrics.count('llm_retry', purpose=purpose)
+                print(f"Retrying LLM call after error: {error}")
+                time.sleep(delay)
+                return
+        self._fail(error, purpose)
+
+    def _fail(self, error, purpose):
+        timed_out = isinstance(error, LLMTimeout)
+        with self._lock:
+            self.failures += 1
+            self.timeouts += timed_out
+        metrics.count('llm_call', purpose=purpose, result='timeout' if timed_out else 'error')
+        if isinstance(error, LLMError):
+            raise error
+        raise LLMError(str(error)) from error
+
+    def _record(self, purpose, seconds, usage, prompt, text):
+        """Account a finished call; token counts come from the API, else from the shared tokenizer"""
+        prompt_tokens, completion_tokens = usage or (count_tokens(prompt), count_tokens(text))
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self._latencies.append(seconds)
+        metrics.count('llm_call', purpose=purpose, result='ok')
+        metrics.count('llm_tokens', prompt_tokens, purpose=purpose, kind='prompt')
+        metrics.count('llm_tokens', completion_tokens, purpose=purpose, kind='completion')
+
+    def warm_up(self):
+        self.backend.warm_up()
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                'backend': self.backend.name,
+                'model': self.model,
+                'timeout_seconds': self.timeout,
+                'max_retries': self.max_retries,
+                'hedge_after_seconds': self.hedge_after or None,
+                'max_in_flight': self.max_in_flight,
+                'calls': self.calls,
+                'failures': self.failures,
+                'timeouts': self.timeouts,
+                'retries': self.retries,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'latency_p50_seconds': round(latencies[len(latencies) // 2], 3) if latencies else None,
+                'latency_p95_seconds': round(latencies[int(len(latencies) * 0.95)], 3) if latencies else None,
+                'rate_limit': self.rate_limiter.stats(),
+            }
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Add a Server-Timing header with the stages timed during each request
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'true').lower() in ('1', 'true', 'yes')
+
+# Seconds; spans range from sub-millisecond lookups to minute-long embeddings of big PDFs
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the Prometheus data model"""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, value, labels=()):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', bound),))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+
+    def inc(self, labels=(), value=1):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_format_labels(labels)} {value}" for labels, value in sorted(self._values.items()))
+        return lines
+
+
+class Metrics:
+    """Process-wide timing spans and counters, rendered for Prometheus at /metrics.
+
+    ``span(stage)`` times a block into the stage histogram. Spans that run on
+    a request thread are also collected for that request, so the response can
+    carry a Server-Timing breakdown. Spans in background upload jobs only feed
+    the histograms.
+    """
+
+    def __init__(self):
+        self.stages = Histogram('chatbot_stage_seconds', 'Time spent in each processing stage')
+        self.requests = Histogram('chatbot_request_seconds', 'HTTP request latency until the response is returned')
+        self.events = Counter('chatbot_events_total', 'Counted events such as cache hits and rejected requests')
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        """Record a stage duration measured elsewhere"""
+        with self._lock:
+            self.stages.observe(seconds, (('stage', stage),))
+        timings = getattr(self._local, 'timings', None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    def count(self, event, value=1, **labels):
+        with self._lock:
+            self.events.inc((('event', event),) + tuple(sorted(labels.items())), value)
+
+    def start_request(self):
+        """Begin collecting spans for the request handled by this thread"""
+        self._local.timings = {}
+        self._local.started = time.perf_counter()
+
+    def finish_request(self, method, endpoint, status):
+        """Record the request latency; returns {stage: seconds} including 'total'"""
+        timings = getattr(self._local, 'timings', None)
+        started = getattr(self._local, 'started', None)
+        self._local.timings = None
+        self._local.started = None
+        if started is None:
+            return {}
+        total = time.perf_counter() - started
+        with self._lock:
+            self.requests.observe(total, (('endpoint', endpoint), ('method', method), ('status', str(status))))
+        return dict(timings or {}, total=total)
+
+    def render(self):
+        with self._lock:
+            lines = self.stages.render() + self.requests.render() + self.events.render()
+        return "\n".join(lines) + "\n"
+
+
+def server_timing_header(timings):
+    """Server-Timing header value, durations in milliseconds"""
+    return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+metrics = Metrics()
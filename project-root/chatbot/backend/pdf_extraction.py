@@ -0,0 +1,104 @@
+import hashlib
+import mmap
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '32'))
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', '16'))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+@contextmanager
+def open_pdf(filepath):
+    """PdfReader over a read-only memory map of the file.
+
+    PyPDF2 seeks and reads small pieces all over a PDF. On a mapping those are
+    page-cache accesses shared by every process reading the file, not read()
+    calls copying into private buffers, so large PDFs do not raise peak memory.
+    """
+    import PyPDF2
+
+    with open(filepath, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield PyPDF2.PdfReader(buffer)
+
+
+def page_hash(page):
+    """SHA-256 of a page's content stream, which fixes the text it shows.
+
+    Decoding the stream is much cheaper than text extraction, so a revised
+    PDF can be compared page by page before anything is extracted.
+    """
+    contents = page.get_contents()
+    return hashlib.sha256(contents.get_data() if contents is not None else b'').hexdigest()
+
+
+def extract_page(page, known_hashes=()):
+    """(hash, text) of a page; text is None when the hash is already known"""
+    digest = page_hash(page)
+    if digest in known_hashes:
+        return digest, None
+    return digest, page.extract_text() or ""
+
+
+def extract_page_range(filepath, start, end, known_hashes=frozenset()):
+    """Hash and extract pages [start, end) in a worker process"""
+    with open_pdf(filepath) as reader:
+        return [extract_page(reader.pages[i], known_hashes) for i in range(start, end)]
+
+
+def _get_pool(workers):
+    """Shared process pool of spawned (not forked) workers.
+
+    Spawning keeps the server's threads and locks out of the workers. Each
+    worker re-imports the launching script, so serve.py and prefork.py import
+    the app only inside main(); a worker loads just this module and PyPDF2.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def iter_pages(filepath, workers=PDF_EXTRACT_WORKERS, min_pages=PDF_PARALLEL_MIN_PAGES,
+               pages_per_task=PDF_PAGES_PER_TASK, known_pages=None):
+    """Yield (page_number, text, pages_total, page_hash) in page order.
+
+    Small files, or a worker count of 1, are read serially in this process.
+    Larger files are split into page ranges that run on a process pool; each
+    range is yielded as soon as it and every range before it are done, so
+    callers can start chunking before the whole document is extracted.
+    Pages whose hash is in ``known_pages`` ({hash: text}, e.g. from the
+    previous version of the document) are not extracted again.
+    """
+    known_pages = known_pages or {}
+    known_hashes = frozenset(known_pages)
+    with open_pdf(filepath) as reader:
+        pages_total = len(reader.pages)
+        if workers <= 1 or pages_total < min_pages:
+            for i, page in enumerate(reader.pages):
+                digest, text = extract_page(page, known_hashes)
+                yield i + 1, known_pages[digest] if text is None else text, pages_total, digest
+            return
+
+    pool = _get_pool(workers)
+    futures = [
+        (start, pool.submit(extract_page_range, filepath, start, min(start + pages_per_task, pages_total),
+                            known_hashes))
+        for start in range(0, pages_total, pages_per_task)
+    ]
+    try:
+        for start, future in futures:
+            for offset, (digest, text) in enumerate(future.result()):
+                yield start + offset + 1, known_pages[digest] if text is None else text, pages_total, digest
+    finally:
+        for _start, future in futures:
+            future.cancel()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Multi-process production server for the PDF Chatbot backend
+Loads the embedding model, tokenizer and corpus index once, then forks
+SERVER_WORKERS worker processes that each serve the app with waitress on the
+same listening socket. The workers share the loaded model's memory
+copy-on-write and map the same index and document text files, so adding a
+worker costs little memory while embedding and PDF parsing, which hold the
+GIL, run in parallel across processes.
+
+Every worker can serve every document: documents, the corpus index and
+upload job progress all live on disk under the upload folder, and a worker
+loads whatever another one has written. Metrics, rate limits and the answer
+cache are per worker.
+
+    python prefork.py --workers 4
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.getenv('SERVER_PORT', '5000'))
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', str(os.cpu_count() or 1)))
+# A worker that dies sooner than this after starting is respawned with a growing delay
+WORKER_MIN_UPTIME = float(os.getenv('WORKER_MIN_UPTIME', '10'))
+WORKER_RESTART_MAX_DELAY = float(os.getenv('WORKER_RESTART_MAX_DELAY', '30'))
+
+
+def configure(workers):
+    """Defaults that must be in place before the app and its libraries are imported"""
+    # Document text is read from shared page-cache mappings instead of a copy per worker
+    os.environ.setdefault('DOCUMENT_TEXT_MMAP', 'true')
+    # Tokenizer thread pools created before fork deadlock in the children
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+    # Split the cores between workers instead of every worker using all of them for torch
+    os.environ.setdefault('EMBEDDING_TORCH_THREADS', str(max(1, (os.cpu_count() or 1) // workers)))
+
+
+def run_worker(worker_id, sock):
+    """Body of a forked worker; never returns"""
+    os.environ['SERVER_WORKER_ID'] = str(worker_id)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    status = 0
+    try:
+        from waitress import serve
+
+        from app import app, warm_up
+        from serve import SERVER_CONNECTION_LIMIT, SERVER_THREADS
+
+        warm_up()
+        serve(app, sockets=[sock], threads=SERVER_THREADS,
+              connection_limit=SERVER_CONNECTION_LIMIT, channel_timeout=300)
+    except Exception as e:
+        print(f"Error in worker {worker_id}: {e}")
+        status = 1
+    finally:
+        sys.stdout.flush()
+        os._exit(status)
+
+
+class Supervisor:
+    """Forks the workers and starts a new one whenever one exits"""
+
+    def __init__(self, sock, workers):
+        self.sock = sock
+        self.workers = workers
+        self.children = {}
+        self.failures = {}
+        self.stopping = False
+
+    def spawn(self, worker_id):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(worker_id, self.sock)
+        self.children[pid] = (worker_id, time.time())
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for worker_id in range(self.workers):
+            self.spawn(worker_id)
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            worker_id, started = self.children.pop(pid, (None, None))
+            if worker_id is None or self.stopping:
+                continue
+            print(f"Worker {worker_id} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}")
+            # Back off while a worker keeps crashing right after it starts
+            if time.time() - started < WORKER_MIN_UPTIME:
+                self.failures[worker_id] = self.failures.get(worker_id, 0) + 1
+            else:
+                self.failures[worker_id] = 0
+            if self.failures[worker_id]:
+                time.sleep(min(WORKER_RESTART_MAX_DELAY, 0.5 * 2 ** self.failures[worker_id]))
+            if not self.stopping:
+                self.spawn(worker_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the backend in several pre-forked worker processes')
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS)
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+
+    if not hasattr(os, 'fork'):
+        # Windows has no fork: run a single multi-threaded server instead
+        print("Pre-forking is not supported on this platform; starting a single process")
+        import serve
+        serve.SERVER_HOST, serve.SERVER_PORT = args.host, args.port
+        serve.main()
+        return
+
+    configure(workers)
+    from app import check_api_key, preload
+
+    check_api_key()
+    print("Loading models and indexes before forking workers...")
+    start = time.perf_counter()
+    preload()
+    print(f"Loaded in {time.perf_counter() - start:.1f}s")
+
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    sock.set_inheritable(True)
+    print(f"Starting PDF Chatbot backend on http://{args.host}:{args.port} ({workers} workers)")
+    Supervisor(sock, workers).run()
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
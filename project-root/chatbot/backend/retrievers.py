@@ -0,0 +1,44 @@
+# LangChain retrievers live here so that importing the index modules does not import
+# langchain; this module is only imported when the first retriever is built.
+from langchain.schema import BaseRetriever
+
+from lexical_index import HYBRID_CANDIDATES_PER_K, reciprocal_rank_fusion
+
+
+class CorpusRetriever(BaseRetriever):
+    """LangChain retriever over the whole corpus (or a subset of documents)"""
+
+    corpus: object
+    embeddings: object
+    k: int = 3
+    document_ids: list = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        vector = self.embeddings.embed_query(query)
+        return [doc for doc, _distance in self.corpus.search_by_vector(vector, self.k, self.document_ids)]
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses vector-store and lexical rankings with reciprocal rank fusion.
+
+    ``lexical_search(query, n)`` returns up to n LangChain documents ranked by
+    BM25. Exact terms the embedding misses (formula names, course codes) then
+    still reach the top k, so fewer chunks are needed in the prompt.
+    """
+
+    vector_store: object
+    lexical_search: object
+    k: int = 3
+    candidates_per_k: int = HYBRID_CANDIDATES_PER_K
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        fetch_k = self.k * self.candidates_per_k
+        dense = self.vector_store.similarity_search(query, k=fetch_k)
+        lexical = self.lexical_search(query, fetch_k)
+        return reciprocal_rank_fusion([dense, lexical], self.k)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Production server for the PDF Chatbot backend
+Serves the Flask app with waitress instead of Flask's development server.
+Requests run on a large thread pool: a chat request spends almost all of its
+time waiting on Mistral with the GIL released, so one process can hold
+hundreds of open chat sessions. Beyond MAX_CONCURRENT_REQUESTS the app
+answers 429.
+
+    python serve.py
+"""
+
+import os
+
+from concurrency import MAX_CONCURRENT_REQUESTS
+
+SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.getenv('SERVER_PORT', '5000'))
+# Headroom above the request limit keeps /status, /jobs and /health responsive under load
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', str(MAX_CONCURRENT_REQUESTS + 32)))
+SERVER_CONNECTION_LIMIT = int(os.getenv('SERVER_CONNECTION_LIMIT', str(SERVER_THREADS * 4)))
+
+
+def main():
+    # Imported here, not at the top: PDF extraction workers are spawned
+    # processes that re-import this script, and must not load the app
+    from waitress import serve
+
+    from app import app, check_api_key, warm_up
+
+    check_api_key()
+    warm_up()
+    print(f"Starting PDF Chatbot backend on http://{SERVER_HOST}:{SERVER_PORT} "
+          f"({SERVER_THREADS} threads, {MAX_CONCURRENT_REQUESTS} concurrent requests)")
+    serve(app, host=SERVER_HOST, port=SERVER_PORT, threads=SERVER_THREADS,
+          connection_limit=SERVER_CONNECTION_LIMIT, channel_timeout=300)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Concurrent LLM calls made for summaries, across all documents in this process
+SUMMARY_CONCURRENCY = int(os.getenv('SUMMARY_CONCURRENCY', '4'))
+# Document tokens summarized by one section (map) call
+SUMMARY_SECTION_TOKENS = int(os.getenv('SUMMARY_SECTION_TOKENS', '3000'))
+SUMMARY_SECTION_MAX_TOKENS = int(os.getenv('SUMMARY_SECTION_MAX_TOKENS', '300'))
+SUMMARY_MAX_TOKENS = int(os.getenv('SUMMARY_MAX_TOKENS', '500'))
+
+SUMMARY_PROMPT = """
+Please provide a comprehensive summary of the following document.
+Include:
+1. Main topics and themes
+2. Key findings and conclusions
+3. Important data or statistics mentioned
+4. Overall purpose and scope of the document
+
+Document content:
+{text}
+
+Summary:
+"""
+
+SECTION_PROMPT = """
+Summarize the following part ({part}) of a longer document.
+Keep the main topics, key findings, and any important data or statistics.
+
+Document part:
+{text}
+
+Section summary:
+"""
+
+REDUCE_PROMPT = """
+Please provide a comprehensive summary of a document, given summaries of its consecutive sections.
+Include:
+1. Main topics and themes
+2. Key findings and conclusions
+3. Important data or statistics mentioned
+4. Overall purpose and scope of the document
+
+Section summaries:
+{text}
+
+Summary:
+"""
+
+_executor = ThreadPoolExecutor(max_workers=SUMMARY_CONCURRENCY, thread_name_prefix='summary')
+
+
+class MapReduceSummarizer:
+    """Summarize a whole document: sections in parallel (map), then combine them (reduce).
+
+    ``complete(prompt, max_tokens)`` performs one LLM call. All calls go
+    through a shared pool of SUMMARY_CONCURRENCY threads, which bounds how many
+    summary requests hit the LLM at once no matter how many documents are
+    being summarized.
+    """
+
+    def __init__(self, complete, encoding, section_tokens=SUMMARY_SECTION_TOKENS,
+                 section_max_tokens=SUMMARY_SECTION_MAX_TOKENS, max_tokens=SUMMARY_MAX_TOKENS):
+        self.complete = complete
+        self.encoding = encoding
+        self.section_tokens = section_tokens
+        self.section_max_tokens = section_max_tokens
+        self.max_tokens = max_tokens
+
+    def split_sections(self, text):
+        """Cut text into consecutive windows of section_tokens tokens (one encode pass)"""
+        tokens = self.encoding.encode_ordinary(text)
+        return [self.encoding.decode(tokens[i:i + self.section_tokens])
+                for i in range(0, len(tokens), self.section_tokens)]
+
+    def submit_section(self, text, part):
+        """Queue one section summary; returns a future"""
+        return _executor.submit(self.complete, SECTION_PROMPT.format(part=part, text=text),
+                                self.section_max_tokens)
+
+    def map(self, sections):
+        """Summarize sections concurrently, keeping document order"""
+        futures = [self.submit_section(section, f"{i + 1} of {len(sections)}")
+                   for i, section in enumerate(sections)]
+        return [future.result().strip() for future in futures]
+
+    def reduce_prompt(self, section_summaries):
+        """Final prompt, collapsing summaries level by level until they fit one call"""
+        combined = "\n\n".join(section_summaries)
+        while len(self.encoding.encode_ordinary(combined)) > self.section_tokens and len(section_summaries) > 1:
+            section_summaries = self.map(self.split_sections(combined))
+            combined = "\n\n".join(section_summaries)
+        return REDUCE_PROMPT.format(text=combined)
+
+    def summarize_text(self, text):
+        """One full summary call over text that fits in a section"""
+        return _executor.submit(self.complete, SUMMARY_PROMPT.format(text=text), self.max_tokens).result().strip()
+
+    def reduce(self, section_summaries):
+        return _executor.submit(self.complete, self.reduce_prompt(section_summaries), self.max_tokens).result().strip()
+
+    def incremental(self):
+        return IncrementalSummary(self)
+
+
+class IncrementalSummary:
+    """Starts section summaries while pages are still being extracted.
+
+    Pages are fed in order; whenever section_tokens worth of text has been
+    collected, a section summary is queued. The first section is held back
+    until a second one exists: a document that fits in one section gets one
+    full summary call instead. ``section_summaries()`` waits for the
+    remaining ones once extraction is done.
+    """
+
+    def __init__(self, summarizer):
+        self.summarizer = summarizer
+        self._pending = []
+        self._pending_tokens = 0
+        self._futures = []
+        self._first_section = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self):
+        """True once at least one section has been collected"""
+        with self._lock:
+            return bool(self._futures) or self._first_section is not None
+
+    def add_page(self, page_text):
+        tokens = len(self.summarizer.encoding.encode_ordinary(page_text))
+        with self._lock:
+            self._pending.append(page_text)
+            self._pending_tokens += tokens
+            if self._pending_tokens >= self.summarizer.section_tokens:
+                self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending = []
+        self._pending_tokens = 0
+        # A very long page can still exceed a section; split it by tokens
+        for section in self.summarizer.split_sections(text):
+            if not self._futures and self._first_section is None:
+                self._first_section = section
+                continue
+            self._submit_first()
+            self._submit(section)
+
+    def _submit(self, section):
+        self._futures.append(self.summarizer.submit_section(section, f"section {len(self._futures) + 1}"))
+
+    def _submit_first(self):
+        if self._first_section is not None:
+            self._submit(self._first_section)
+            self._first_section = None
+
+    def section_summaries(self):
+        with self._lock:
+            self._flush()
+            self._submit_first()
+            futures = list(self._futures)
+        return [future.result().strip() for future in futures]
+
+    def summary(self):
+        with self._lock:
+            self._flush()
+            only_section = self._first_section
+        if only_section is not None:
+            return self.summarizer.summarize_text(only_section)
+        summaries = self.section_summaries()
+        if not summaries:
+            return ""
+        return self.summarizer.reduce(summaries)
+
+    def cancel(self):
+        with self._lock:
+            self._first_section = None
+            for future in self._futures:
+                future.cancel()
+
+
+class SharedStream:
+    """Tokens of one streamed generation, replayed from the start to every reader.
+
+    The producer calls ``put`` and finally ``close``; any number of readers
+    iterate concurrently, each seeing every token in order.
+    """
+
+    def __init__(self):
+        self._tokens = []
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def put(self, token):
+        with self._condition:
+            self._tokens.append(token)
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def text(self):
+        with self._condition:
+            return "".join(self._tokens)
+
+    def __iter__(self):
+        position = 0
+        while True:
+            with self._condition:
+                while position == len(self._tokens) and not self._closed:
+                    self._condition.wait()
+                tokens = self._tokens[position:]
+                closed = self._closed
+            position += len(tokens)
+            yield from tokens
+            if closed and not tokens:
+                return
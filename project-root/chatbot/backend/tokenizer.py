@@ -0,0 +1,23 @@
+import os
+from functools import lru_cache
+
+# Reference tokenizer for budgets; Mistral's own tokenizer counts within a few percent
+TOKENIZER_MODEL = os.getenv('TOKENIZER_MODEL', 'gpt-3.5-turbo')
+
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    """tiktoken encoding, built once per process"""
+    import tiktoken
+
+    return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+
+
+def count_tokens(text):
+    """Number of tokens in text (special-token strings are counted as plain text)"""
+    return len(get_encoding().encode_ordinary(text))
+
+
+def count_tokens_batch(texts):
+    """Token counts for many texts, encoded on tiktoken's thread pool"""
+    return [len(tokens) for tokens in get_encoding().encode_ordinary_batch(list(texts))]
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import uuid
+
+UPLOAD_MAX_MB = int(os.getenv('UPLOAD_MAX_MB', '200'))
+PDF_MAGIC = b'%PDF-'
+# PDF readers accept junk before the header as long as it starts within the first 1024 bytes
+PDF_HEADER_WINDOW = 1024
+
+
+class UploadRejected(Exception):
+    """An upload refused while it is still being received.
+
+    Deliberately not a ValueError: werkzeug silently drops ValueErrors raised
+    while parsing a form, which would turn this into "No PDF file provided".
+    """
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class HashingUploadFile:
+    """Destination of one uploaded file part, used as werkzeug's file stream.
+
+    The multipart parser writes the body here chunk by chunk. Each chunk goes
+    straight to disk and into a SHA-256 digest, so the upload is never held in
+    memory and never read back just to hash it. A part without the PDF magic
+    bytes in its first PDF_HEADER_WINDOW bytes, or that grows past max_bytes,
+    is rejected mid-stream.
+    """
+
+    def __init__(self, directory, filename, max_bytes=UPLOAD_MAX_MB * 1024 * 1024):
+        self.filename = os.path.basename(filename or '')
+        # Unique on-disk name so concurrent uploads of the same file never collide
+        self.path = os.path.join(directory, f"{uuid.uuid4().hex[:12]}_{self.filename or 'upload'}")
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._header = b''
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, 'w+b')
+        # Set once the file is handed to an upload job; anything unclaimed is deleted after the request
+        self.claimed = False
+
+    @property
+    def is_pdf(self):
+        return PDF_MAGIC in self._header
+
+    def write(self, data):
+        if len(self._header) < PDF_HEADER_WINDOW:
+            self._header += data[:PDF_HEADER_WINDOW - len(self._header)]
+            if len(self._header) == PDF_HEADER_WINDOW and not self.is_pdf:
+                self.discard()
+                raise UploadRejected('Only PDF files are allowed')
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise UploadRejected(f'PDF exceeds the {self.max_bytes // (1024 * 1024)} MB upload limit', 413)
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def sha256(self):
+        """Hex digest of everything written so far"""
+        return self._digest.hexdigest()
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def flush(self):
+        self._file.flush()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        """Close and delete the partial or rejected file"""
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,179 @@
+import os
+
+from chunk_store import ChunkDocstore, ChunkPositions
+
+# faiss, numpy and langchain are imported where they are used, keeping app start-up fast
+
+# float32 keeps exact vectors; float16 halves and int8 quarters index memory
+EMBEDDING_PRECISION = os.getenv('EMBEDDING_PRECISION', 'float32')
+
+# Precision -> name of the FAISS scalar quantizer type
+SCALAR_QUANTIZERS = {
+    'float16': 'QT_fp16',
+    'int8': 'QT_8bit',
+}
+
+
+# flat (exact), ivf or hnsw; auto picks by the number of vectors
+INDEX_MODE = os.getenv('INDEX_MODE', 'auto')
+INDEX_AUTO_FLAT_MAX = int(os.getenv('INDEX_AUTO_FLAT_MAX', '20000'))
+INDEX_AUTO_HNSW_MAX = int(os.getenv('INDEX_AUTO_HNSW_MAX', '200000'))
+# 0 derives nlist from the number of training vectors
+IVF_NLIST = int(os.getenv('IVF_NLIST', '0'))
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', '16'))
+HNSW_M = int(os.getenv('HNSW_M', '32'))
+HNSW_EF_CONSTRUCTION = int(os.getenv('HNSW_EF_CONSTRUCTION', '80'))
+HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', '64'))
+
+INDEX_MODES = ('flat', 'ivf', 'hnsw')
+
+
+def select_index_mode(num_vectors, mode=INDEX_MODE, allow_hnsw=True):
+    """Resolve 'auto' to a concrete index mode for a corpus of num_vectors"""
+    if mode != 'auto':
+        if mode not in INDEX_MODES:
+            raise ValueError(f"Unknown index mode: {mode}")
+        return mode
+    if num_vectors < INDEX_AUTO_FLAT_MAX:
+        return 'flat'
+    if allow_hnsw and num_vectors < INDEX_AUTO_HNSW_MAX:
+        return 'hnsw'
+    return 'ivf'
+
+
+def default_nlist(num_vectors):
+    """About 4*sqrt(n) lists, keeping ~39 training points per list as FAISS recommends"""
+    if IVF_NLIST:
+        return IVF_NLIST
+    return max(1, min(int(4 * num_vectors ** 0.5), num_vectors // 39))
+
+
+def make_index(dim, precision=EMBEDDING_PRECISION, mode='flat', num_vectors=0, nlist=None,
+               hnsw_m=HNSW_M):
+    """Create an empty L2 FAISS index of the given mode and vector precision.
+
+    flat is exact brute force. ivf partitions vectors into nlist inverted
+    lists and must be trained; hnsw is a graph index with fast queries but no
+    support for removing vectors.
+    """
+    import faiss
+
+    if precision != 'float32' and precision not in SCALAR_QUANTIZERS:
+        raise ValueError(f"Unknown embedding precision: {precision}")
+    qtype = getattr(faiss.ScalarQuantizer, SCALAR_QUANTIZERS[precision]) if precision in SCALAR_QUANTIZERS else None
+
+    if mode == 'flat':
+        if qtype is None:
+            return faiss.IndexFlatL2(dim)
+        return faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2)
+    if mode == 'ivf':
+        quantizer = faiss.IndexFlatL2(dim)
+        nlist = nlist or default_nlist(num_vectors)
+        if qtype is None:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype, faiss.METRIC_L2)
+        # The index keeps a reference; stop Python from freeing the quantizer
+        index.own_fields = True
+        quantizer.this.disown()
+    elif mode == 'hnsw':
+        if qtype is None:
+            index = faiss.IndexHNSWFlat(dim, hnsw_m)
+        else:
+            index = faiss.IndexHNSWSQ(dim, qtype, hnsw_m)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        raise ValueError(f"Unknown index mode: {mode}")
+    apply_search_params(index)
+    return index
+
+
+def apply_search_params(index, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH):
+    """Set query-time knobs (IVF nprobe, HNSW efSearch) on an index or its wrapped index"""
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+    base = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+    if hasattr(base, 'hnsw'):
+        base.hnsw.efSearch = ef_search
+    return index
+
+
+def selection_params(index, ids):
+    """(selector, search parameters) that restrict a search to the vectors with the given ids.
+
+    IVF searches probe every list, so the nearest selected vectors are found
+    however few of them there are.
+    """
+    import faiss
+    import numpy as np
+
+    selector = faiss.IDSelectorBatch(np.asarray(ids, dtype='int64'))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return selector, faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nlist)
+    return selector, faiss.SearchParameters(sel=selector)
+
+
+def read_index(path, memory_map=True):
+    """Read a FAISS index file; returns (index, whether its data is memory-mapped from the file).
+
+    Only IO_FLAG_MMAP_IFC maps flat, scalar-quantized and HNSW storage; plain
+    IO_FLAG_MMAP silently copies those into process memory. Whether the file
+    really is mapped is read from /proc/self/maps, and is None where that is
+    not available.
+    """
+    import faiss
+
+    if memory_map:
+        try:
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+            return index, is_file_mapped(path)
+        except RuntimeError:
+            # Index types without mmap support are read normally
+            pass
+    return faiss.read_index(path), False
+
+
+def is_file_mapped(path):
+    """True when path is memory-mapped into this process, None when that cannot be checked"""
+    path = os.path.realpath(path)
+    try:
+        with open('/proc/self/maps', 'r') as maps:
+            return any(line.rstrip('\n').endswith(' ' + path) for line in maps)
+    except OSError:
+        return None
+
+
+def index_mode(index):
+    """Name of the mode an index was built with"""
+    import faiss
+
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    if faiss.try_extract_index_ivf(index) is not None:
+        return 'ivf'
+    if hasattr(index, 'hnsw'):
+        return 'hnsw'
+    return 'flat'
+
+
+def build_faiss_store(chunks, vectors, embeddings, precision=EMBEDDING_PRECISION, mode=INDEX_MODE):
+    """Index precomputed vectors of a ChunkStore's chunks in a LangChain FAISS store without re-embedding"""
+    import numpy as np
+
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    index = make_index(vectors.shape[1], precision, select_index_mode(len(vectors), mode), len(vectors))
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return faiss_store(index, embeddings, chunks)
+
+
+def faiss_store(index, embeddings, chunks):
+    """LangChain FAISS store over an index whose row i is chunk i; chunk text is read from the ChunkStore"""
+    from langchain.vectorstores import FAISS
+
+    return FAISS(embeddings, index, ChunkDocstore(chunks), ChunkPositions(len(chunks)))
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+
+# Load heavy libraries and models on a background thread right after start-up
+WARMUP_ENABLED = os.getenv('EMBEDDING_WARMUP', 'true').lower() in ('1', 'true', 'yes')
+
+
+class WarmUp:
+    """Runs named start-up steps on a daemon thread and records their timings.
+
+    The server accepts requests while this runs: /health answers at once and
+    /ready reports 503 until every step has finished. A request that needs
+    something not yet loaded simply loads it itself, as without warm-up.
+    """
+
+    def __init__(self):
+        self._steps = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self.started = None
+        self.finished = None
+        self.timings = {}
+        self.errors = {}
+
+    def add(self, name, func):
+        self._steps.append((name, func))
+
+    def start(self):
+        """Start the steps in the background (once) and return the thread"""
+        with self._lock:
+            if self._thread is None:
+                self.started = time.time()
+                self._thread = threading.Thread(target=self._run, name='warm-up', daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def run(self):
+        """Run the steps on the calling thread and return once all have finished"""
+        self.started = time.time()
+        self._run()
+
+    def _run(self):
+        for name, func in self._steps:
+            start = time.perf_counter()
+            try:
+                func()
+            except Exception as e:
+                print(f"Error warming up {name}: {e}")
+                self.errors[name] = str(e)
+            self.timings[name] = round(time.perf_counter() - start, 3)
+        self.finished = time.time()
+
+    @property
+    def running(self):
+        return self._thread is not None and self.finished is None
+
+    @property
+    def ready(self):
+        """False only while warm-up is in progress; failed steps do not block readiness"""
+        return not self.running
+
+    def stats(self):
+        return {
+            'enabled': self.started is not None,
+            'ready': self.ready,
+            'seconds': round((self.finished or time.time()) - self.started, 3) if self.started else None,
+            'steps': dict(self.timings),
+            'errors': dict(self.errors)
+        }
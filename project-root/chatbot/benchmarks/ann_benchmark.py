@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Recall vs latency benchmark for the FAISS index modes
+Chunks a PDF page by page with PDFProcessor.iter_chunks, as uploads do,
+embeds the chunks with the shared embedding model, and compares flat, IVF and
+HNSW indexes against exact (flat) search. Use --replicate to simulate a larger corpus by adding
+jittered copies of the chunk vectors.
+
+    python benchmarks/ann_benchmark.py path/to/textbook.pdf --replicate 50
+"""
+
+import argparse
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import faiss  # noqa: E402
+
+# Importing the app creates its upload folder and opens the corpus index; keep both out of the real ones
+WORKDIR = tempfile.mkdtemp(prefix='ann_benchmark_')
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
+os.environ['UPLOAD_FOLDER'] = os.path.join(WORKDIR, 'uploads')
+os.environ['CORPUS_INDEX_DIR'] = os.path.join(WORKDIR, 'corpus_index')
+
+from app import pdf_processor  # noqa: E402
+from embeddings import embedding_service  # noqa: E402
+from vector_index import apply_search_params, default_nlist, make_index  # noqa: E402
+
+
+def load_vectors(pdf_path, replicate, noise, seed):
+    """Embed the PDF's chunks and optionally grow them into a synthetic corpus"""
+    pages = ((page_num, page_text) for page_num, page_text, _page_hash in pdf_processor.iter_pages(pdf_path))
+    chunks = list(pdf_processor.iter_chunks(pages))
+    if not chunks:
+        raise SystemExit(f"No text chunks extracted from {pdf_path}")
+    vectors, run = embedding_service.embed_documents(chunks)
+    print(f"Embedded {len(chunks)} chunks at {run['chunks_per_second']} chunks/s")
+
+    rng = np.random.default_rng(seed)
+    copies = [vectors]
+    for _ in range(replicate - 1):
+        copies.append(vectors + rng.normal(0, noise, vectors.shape).astype('float32'))
+    return chunks, np.ascontiguousarray(np.vstack(copies), dtype='float32')
+
+
+def make_queries(chunks, num_queries, seed):
+    """Use sentences taken from the chunks as realistic student queries"""
+    rng = np.random.default_rng(seed)
+    sentences = [s.strip() for chunk in chunks for s in chunk.split('.') if len(s.split()) >= 5]
+    if not sentences:
+        sentences = chunks
+    picks = rng.choice(len(sentences), size=min(num_queries, len(sentences)), replace=False)
+    queries, _run = embedding_service.embed_documents([sentences[i] for i in picks])
+    return queries
+
+
+def time_queries(index, queries, k):
+    """Search one query at a time, like /chat does; returns (ids, latencies in ms)"""
+    ids = np.empty((len(queries), k), dtype='int64')
+    latencies = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _distances, found = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids[i] = found[0]
+    return ids, np.array(latencies)
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def benchmark(vectors, queries, k, configs, precision):
+    """Build each index config and measure build time, recall@k and latency"""
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    truth, _latencies = time_queries(exact, queries, k)
+
+    results = []
+    for config in configs:
+        start = time.perf_counter()
+        index = make_index(vectors.shape[1], precision, config['mode'], len(vectors), nlist=config.get('nlist'))
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+        apply_search_params(index, nprobe=config.get('nprobe', 1), ef_search=config.get('ef_search', 16))
+
+        found, latencies = time_queries(index, queries, k)
+        results.append(dict(
+            config,
+            build_seconds=round(build_seconds, 3),
+            recall=round(recall_at_k(found, truth), 4),
+            p50_ms=round(float(np.percentile(latencies, 50)), 4),
+            p95_ms=round(float(np.percentile(latencies, 95)), 4),
+        ))
+    return results
+
+
+def default_configs(num_vectors):
+    nlist = default_nlist(num_vectors)
+    configs = [{'mode': 'flat'}]
+    for nprobe in (1, 4, 16, 64):
+        if nprobe <= nlist:
+            configs.append({'mode': 'ivf', 'nlist': nlist, 'nprobe': nprobe})
+    for ef_search in (16, 32, 64, 128):
+        configs.append({'mode': 'hnsw', 'ef_search': ef_search})
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare FAISS index modes on a PDF')
+    parser.add_argument('pdf', help='PDF to chunk and embed')
+    parser.add_argument('--replicate', type=int, default=1, help='jittered copies of the chunk vectors')
+    parser.add_argument('--noise', type=float, default=0.02, help='std-dev of the jitter')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=3, help='neighbours per query (the /chat default)')
+    parser.add_argument('--precision', default='float32', choices=['float32', 'float16', 'int8'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    chunks, vectors = load_vectors(args.pdf, args.replicate, args.noise, args.seed)
+    queries = make_queries(chunks, args.queries, args.seed)
+    print(f"Corpus: {len(vectors)} vectors, {len(queries)} queries, k={args.k}, precision={args.precision}\n")
+
+    results = benchmark(vectors, queries, args.k, default_configs(len(vectors)), args.precision)
+
+    print(f"{'mode':<6} {'params':<22} {'build s':>8} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for result in results:
+        params = ', '.join(f"{key}={result[key]}" for key in ('nlist', 'nprobe', 'ef_search') if key in result)
+        print(f"{result['mode']:<6} {params:<22} {result['build_seconds']:>8} {result['recall']:>7} "
+              f"{result['p50_ms']:>8} {result['p95_ms']:>8}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'vectors': len(vectors), 'queries': len(queries), 'k': args.k,
+                       'precision': args.precision, 'results': results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Offline load benchmark for the RAG pipeline
+Generates synthetic PDFs, starts a fake Mistral server and the backend
+(serve.py, or prefork.py with --workers) on local ports, and measures throughput and p50/p95/p99 latency of
+/upload, /chat (blocking and streamed) and /summary at several concurrency
+levels. Nothing leaves the machine; the embedding model must already be in
+the local HuggingFace cache.
+
+    python benchmarks/rag_benchmark.py --concurrency 1 4 16 --json results.json
+    python benchmarks/rag_benchmark.py --json new.json --compare results.json
+    python benchmarks/rag_benchmark.py --workers 4 --json prefork.json --compare results.json
+
+--compare exits with status 1 when a p95 latency or a throughput regressed by
+more than --tolerance against the baseline file.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+CHATBOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BACKEND_DIR = os.path.join(CHATBOT_DIR, 'backend')
+sys.path.insert(0, CHATBOT_DIR)
+
+from fake_mistral import start_in_background  # noqa: E402
+
+VOCABULARY = """
+analysis approximation boundary calculus coefficient convergence derivative differential
+distribution eigenvalue entropy equilibrium estimator function gradient hypothesis integral
+interpolation iteration kernel lemma likelihood linear matrix momentum network normalization
+optimization oscillation parameter polynomial probability projection quantum regression
+residual sampling sequence spectrum stability statistic tensor theorem thermodynamics
+topology trajectory transform variance vector velocity wavelength algorithm complexity
+""".split()
+
+LINES_PER_PAGE = 45
+WORDS_PER_LINE = 11
+
+
+def synthetic_pages(pages, seed):
+    """Deterministic lecture-note-like text; every page names a course code and a formula"""
+    rng = random.Random(seed)
+    document = []
+    for page in range(pages):
+        lines = [f"Lecture {page + 1}: course MATH-{rng.randint(100, 499)} covers the "
+                 f"{rng.choice(VOCABULARY)}-{rng.choice(VOCABULARY)} formula."]
+        for _ in range(LINES_PER_PAGE - 1):
+            lines.append(' '.join(rng.choice(VOCABULARY) for _ in range(WORDS_PER_LINE)) + '.')
+        document.append(lines)
+    return document
+
+
+def _pdf_string(text):
+    return '(' + text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+
+def write_pdf(path, pages):
+    """Write a minimal text PDF (Helvetica, one content stream per page) with the stdlib only"""
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        content = "BT /F1 10 Tf 14 TL 50 760 Td\n" + "".join(
+            f"{_pdf_string(line)} Tj T*\n" for line in lines) + "ET"
+        content = content.encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(output)
+
+
+def percentile(sorted_values, p):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(endpoint, concurrency, samples, wall_seconds):
+    """Aggregate (status_code, latency_s, ttft_s) samples of one phase"""
+    ok = sorted(latency for status, latency, _ttft in samples if status == 200)
+    ttfts = sorted(ttft for status, _latency, ttft in samples if status == 200 and ttft is not None)
+    status_codes = {}
+    for status, _latency, _ttft in samples:
+        status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+    result = {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'ok': len(ok),
+        'status_codes': status_codes,
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_rps': round(len(ok) / wall_seconds, 3) if wall_seconds else None,
+    }
+    for p in (50, 95, 99):
+        value = percentile(ok, p)
+        result[f'p{p}_ms'] = round(value * 1000, 1) if value is not None else None
+    if ttfts:
+        for p in (50, 95, 99):
+            result[f'ttft_p{p}_ms'] = round(percentile(ttfts, p) * 1000, 1)
+    return result
+
+
+def run_phase(concurrency, tasks):
+    """Run callables returning (status, latency, ttft) on `concurrency` threads"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(lambda task: task(), tasks))
+    return samples, time.perf_counter() - start
+
+
+def timed(method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = requests.request(method, url, timeout=600, **kwargs)
+        return response, time.perf_counter() - start
+    except requests.RequestException:
+        return None, time.perf_counter() - start
+
+
+def upload_task(base_url, pdf_path, document_ids):
+    def task():
+        with open(pdf_path, 'rb') as f:
+            response, latency = timed('POST', f"{base_url}/upload", params={'wait': '1'},
+                                      files={'pdf': (os.path.basename(pdf_path), f, 'application/pdf')},
+                                      data={'defer_summary': 'true'})
+        if response is not None and response.status_code == 200:
+            document_ids.append(response.json()['document_id'])
+        return (response.status_code if response is not None else 'error'), latency, None
+    return task
+
+
+def chat_task(base_url, document_id, question):
+    def task():
+        response, latency = timed('POST', f"{base_url}/chat",
+                                  json={'message': question, 'document_id': document_id})
+        return (response.status_code if response is not None else 'error'), latency, None
+    return task
+
+
+def stream_task(base_url, document_id, question):
+    def task():
+        start = time.perf_counter()
+        ttft = None
+        try:
+            response = requests.post(f"{base_url}/chat", stream=True, timeout=600,
+                                     json={'message': question, 'document_id': document_id, 'stream': True})
+            for line in response.iter_lines(decode_unicode=True):
+                if ttft is None and line and line.startswith('data: ') and '"token"' in line:
+                    ttft = time.perf_counter() - start
+            status = response.status_code
+        except requests.RequestException:
+            status = 'error'
+        return status, time.perf_counter() - start, ttft
+    return task
+
+
+def summary_task(base_url, document_id):
+    def task():
+        response, latency = timed('GET', f"{base_url}/summary", params={'document_id': document_id})
+        return (response.status_code if response is not None else 'error'), latency, None
+    return task
+
+
+def questions_for(level, count, seed):
+    """Distinct questions so the answer cache never short-circuits the pipeline"""
+    rng = random.Random(seed * 7919 + level)
+    return [f"What does the lecture say about {rng.choice(VOCABULARY)} and {rng.choice(VOCABULARY)} "
+            f"in MATH-{rng.randint(100, 499)} (question {i})?" for i in range(count)]
+
+
+def benchmark_level(base_url, workdir, concurrency, args):
+    """Upload fresh documents, then chat with and summarize them, at one concurrency level"""
+    pdfs = []
+    for i in range(args.uploads):
+        path = os.path.join(workdir, f"synthetic_c{concurrency}_{i}.pdf")
+        write_pdf(path, synthetic_pages(args.pages, seed=args.seed * 100003 + concurrency * 1000 + i))
+        pdfs.append(path)
+
+    document_ids = []
+    results = [summarize('upload', concurrency,
+                         *run_phase(concurrency, [upload_task(base_url, path, document_ids) for path in pdfs]))]
+    if not document_ids:
+        print(f"  no upload succeeded at concurrency {concurrency}; skipping chat and summary")
+        return results
+
+    targets = [(document_ids[i % len(document_ids)], question)
+               for i, question in enumerate(questions_for(concurrency, args.chats, args.seed))]
+    results.append(summarize('chat', concurrency, *run_phase(
+        concurrency, [chat_task(base_url, document_id, question) for document_id, question in targets])))
+    results.append(summarize('chat_stream', concurrency, *run_phase(
+        concurrency, [stream_task(base_url, document_id, question + ' (streamed)')
+                      for document_id, question in targets])))
+    # Each document is summarized once, so every request is a cold summary
+    results.append(summarize('summary', concurrency, *run_phase(
+        concurrency, [summary_task(base_url, document_id) for document_id in document_ids])))
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def start_backend(workdir, mistral_url, args):
+    """Start serve.py (prefork.py with --workers) with isolated upload/cache/corpus directories and the answer cache off.
+    
+    Without mistral_url the backend answers with its in-process fake model (LLM_BACKEND=fake).
+    """
+    port = free_port()
+    if mistral_url:
+        llm_env = {'MISTRAL_ENDPOINT': mistral_url, 'MISTRAL_API_KEY': 'fake'}
+    else:
+        llm_env = {'LLM_BACKEND': 'fake', 'FAKE_LLM_FIRST_TOKEN_DELAY': str(args.first_token_delay),
+                   'FAKE_LLM_TOKEN_DELAY': str(args.token_delay)}
+    env = dict(os.environ,
+               **llm_env,
+               SERVER_HOST='127.0.0.1',
+               SERVER_PORT=str(port),
+               UPLOAD_FOLDER=os.path.join(workdir, 'uploads'),
+               CORPUS_INDEX_DIR=os.path.join(workdir, 'corpus_index'),
+               ANSWER_CACHE_SIZE='0',
+               ANSWER_CACHE_SIMILARITY='0',
+               HF_HUB_OFFLINE='1',
+               TRANSFORMERS_OFFLINE='1')
+    log = open(os.path.join(workdir, 'backend.log'), 'w')
+    command = ['prefork.py', '--workers', str(args.workers)] if args.workers else ['serve.py']
+    process = subprocess.Popen([sys.executable, *command], cwd=BACKEND_DIR, env=env,
+                               stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    if not wait_for(f"{base_url}/ready", args.startup_timeout):
+        process.terminate()
+        raise SystemExit(f"Backend did not start; see {log.name}")
+    return process, base_url
+
+
+def warm_up(base_url, workdir, args):
+    """One unmeasured upload, chat and summary so model loading is not timed"""
+    path = os.path.join(workdir, 'warmup.pdf')
+    write_pdf(path, synthetic_pages(2, seed=-1))
+    document_ids = []
+    status, _latency, _ttft = upload_task(base_url, path, document_ids)()
+    if status != 200:
+        raise SystemExit(f"Warm-up upload failed with status {status}")
+    chat_task(base_url, document_ids[0], 'warm-up question')()
+    summary_task(base_url, document_ids[0])()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=CHATBOT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    """Print changes against a baseline run; returns the number of regressions"""
+    with open(baseline_path) as f:
+        baseline = {(r['endpoint'], r['concurrency']): r for r in json.load(f)['results']}
+    regressions = 0
+    print(f"\nAgainst {baseline_path} (tolerance {tolerance:.0%}):")
+    for result in results:
+        before = baseline.get((result['endpoint'], result['concurrency']))
+        if not before:
+            continue
+        notes = []
+        if before.get('p95_ms') and result.get('p95_ms') and result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            notes.append(f"p95 {before['p95_ms']} -> {result['p95_ms']} ms")
+        if before.get('throughput_rps') and (result.get('throughput_rps') or 0) < before['throughput_rps'] * (1 - tolerance):
+            notes.append(f"throughput {before['throughput_rps']} -> {result['throughput_rps']} req/s")
+        regressions += bool(notes)
+        status = "REGRESSION " + "; ".join(notes) if notes else "ok"
+        print(f"  {result['endpoint']:<12} c={result['concurrency']:<4} {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline throughput/latency benchmark of the RAG pipeline')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--uploads', type=int, default=4, help='documents uploaded (and summarized) per level')
+    parser.add_argument('--pages', type=int, default=10, help='pages per synthetic PDF')
+    parser.add_argument('--chats', type=int, default=40, help='chat requests per level (blocking and streamed)')
+    parser.add_argument('--first-token-delay', type=float, default=0.3, help='fake Mistral latency before the first token')
+    parser.add_argument('--token-delay', type=float, default=0.01, help='fake Mistral latency between tokens')
+    parser.add_argument('--llm', choices=('server', 'local'), default='server',
+                        help='fake Mistral over HTTP through the real client, or the in-process fake model')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='run the backend as this many pre-forked processes (0: one serve.py process)')
+    parser.add_argument('--server-url', help='benchmark an already running backend instead of starting one')
+    parser.add_argument('--startup-timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='baseline JSON from an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary work directory')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='rag_benchmark_')
+    fake_server = None
+    backend = None
+    try:
+        if args.server_url:
+            base_url = args.server_url.rstrip('/')
+        elif args.llm == 'local':
+            backend, base_url = start_backend(workdir, None, args)
+        else:
+            fake_server = start_in_background(port=free_port(), first_token_delay=args.first_token_delay,
+                                              token_delay=args.token_delay)
+            mistral_url = f"http://127.0.0.1:{fake_server.server_address[1]}"
+            backend, base_url = start_backend(workdir, mistral_url, args)
+        print(f"Benchmarking {base_url} (work directory {workdir})")
+        warm_up(base_url, workdir, args)
+
+        results = []
+        for concurrency in args.concurrency:
+            print(f"\nConcurrency {concurrency}")
+            for result in benchmark_level(base_url, workdir, concurrency, args):
+                results.append(result)
+                ttft = f" ttft p50 {result['ttft_p50_ms']} ms" if 'ttft_p50_ms' in result else ""
+                print(f"  {result['endpoint']:<12} {result['ok']}/{result['requests']} ok "
+                      f"{result['throughput_rps']} req/s  p50 {result['p50_ms']}  p95 {result['p95_ms']}  "
+                      f"p99 {result['p99_ms']} ms{ttft}")
+    finally:
+        if backend is not None:
+            backend.terminate()
+            backend.wait(timeout=30)
+        if fake_server is not None:
+            fake_server.shutdown()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('json', 'compare', 'keep', 'server_url')},
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Mistral AI chat completions API
+Point the backend at it with MISTRAL_ENDPOINT=http://127.0.0.1:8089 and any
+MISTRAL_API_KEY to exercise uploads, chat and streaming without network access.
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = ("This is a canned answer from the local fake Mistral server. "
+                 "It echoes part of the question so responses differ between prompts.")
+
+
+def build_reply(messages, reply=DEFAULT_REPLY):
+    """Deterministic reply text derived from the last user message"""
+    last = messages[-1]['content'] if messages else ''
+    words = last.split()
+    return f"{reply} Prompt had {len(words)} words ending with: {' '.join(words[-8:])}"
+
+
+class FakeMistralHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Overridden by make_server()
+    first_token_delay = 0.2
+    token_delay = 0.02
+    reply = DEFAULT_REPLY
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/v1/models':
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'mistral-small-latest', 'object': 'model'}]})
+        else:
+            self._send_json(404, {'message': 'Not found'})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._send_json(404, {'message': 'Not found'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'message': 'Invalid JSON'})
+            return
+
+        messages = request.get('messages', [])
+        model = request.get('model', 'mistral-small-latest')
+        tokens = [word + ' ' for word in build_reply(messages, self.reply).split()]
+        max_tokens = request.get('max_tokens')
+        if max_tokens:
+            tokens = tokens[:max_tokens]
+        completion_id = f"cmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        prompt_tokens = sum(len(m.get('content', '').split()) for m in messages)
+
+        time.sleep(self.first_token_delay)
+        if request.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for index, token in enumerate(tokens):
+                if index:
+                    time.sleep(self.token_delay)
+                chunk = {
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                    'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': token}, 'finish_reason': None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            final = {
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'delta': {'content': ''}, 'finish_reason': 'stop'}],
+            }
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        time.sleep(self.token_delay * max(len(tokens) - 1, 0))
+        self._send_json(200, {
+            'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(tokens).strip()},
+                         'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                      'total_tokens': prompt_tokens + len(tokens)},
+        })
+
+
+def make_server(host='127.0.0.1', port=8089, first_token_delay=0.2, token_delay=0.02, reply=DEFAULT_REPLY):
+    """Create (but do not start) a fake Mistral server"""
+    handler = type('ConfiguredFakeMistralHandler', (FakeMistralHandler,), {
+        'first_token_delay': first_token_delay,
+        'token_delay': token_delay,
+        'reply': reply,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(**kwargs):
+    """Start a fake server on a daemon thread; returns the server"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, name='fake-mistral', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local fake Mistral AI server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--first-token-delay', type=float, default=0.2, help='seconds before the first token')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='seconds between streamed tokens')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.first_token_delay, args.token_delay)
+    print(f"Fake Mistral server listening on http://{args.host}:{args.port}")
+    print(f"Start the backend with MISTRAL_ENDPOINT=http://{args.host}:{args.port} MISTRAL_API_KEY=fake")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ Startup script for the AI PDF Assistant chatbot
 This script helps you start the chatbot and checks your setup
 """
 
+import importlib.util
 import os
 import sys
 import subprocess
@@ -24,16 +25,20 @@ def check_dependencies():
     """Check if required packages are installed"""
     required_packages = [
         'flask', 'flask_cors', 'PyPDF2', 'mistralai', 
-        'python-dotenv', 'langchain', 'langchain-mistralai', 'tiktoken'
+        'python-dotenv', 'langchain', 'tiktoken', 'waitress'
     ]
     
+    # Import names that differ from the pip package name
+    module_names = {'python-dotenv': 'dotenv'}
+    
     missing_packages = []
     
     for package in required_packages:
-        try:
-            __import__(package.replace('-', '_'))
+        # find_spec locates the package without importing it, so the check stays fast
+        module = module_names.get(package, package.replace('-', '_'))
+        if importlib.util.find_spec(module) is not None:
             print(f"✅ {package}")
-        except ImportError:
+        else:
             missing_packages.append(package)
             print(f"❌ {package} - Missing")
     
@@ -101,20 +106,20 @@ def start_backend():
         
         os.chdir(backend_dir)
         
-        # Check if app.py exists
-        if not Path('app.py').exists():
-            print("❌ app.py not found in backend directory")
+        # Check if the production launcher exists
+        if not Path('prefork.py').exists():
+            print("❌ prefork.py not found in backend directory")
             return False
         
         print("✅ Backend files found")
-        print("🌐 Starting Flask server on http://127.0.0.1:5000")
+        print("🌐 Starting production server on http://127.0.0.1:5000")
         print("📱 You can now open the frontend in your browser")
         print("\n" + "="*50)
         print("Press Ctrl+C to stop the server")
         print("="*50)
         
-        # Start the Flask app
-        subprocess.run([sys.executable, 'app.py'])
+        # Pre-forked workers sharing the loaded models; SERVER_WORKERS sets how many
+        subprocess.run([sys.executable, 'prefork.py'])
         
     except KeyboardInterrupt:
         print("\n\n🛑 Server stopped by user")
@@ -8,11 +8,15 @@ import requests
 import json
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuration
 BASE_URL = "http://127.0.0.1:5000"
 TEST_PDF_PATH = "test_sample.pdf"  # You'll need to create this or use an existing PDF
 
+# Set by the upload test and sent with later requests
+document_id = None
+
 def test_health_endpoint():
     """Test the health check endpoint"""
     print("🔍 Testing health endpoint...")
@@ -50,6 +54,7 @@ def test_status_endpoint():
 
 def test_pdf_upload():
     """Test PDF upload functionality"""
+    global document_id
     print("\n🔍 Testing PDF upload...")
     
     # Check if test PDF exists
@@ -63,11 +68,27 @@ def test_pdf_upload():
             files = {'pdf': (TEST_PDF_PATH, pdf_file, 'application/pdf')}
             response = requests.post(f"{BASE_URL}/upload", files=files)
             
-            if response.status_code == 200:
+            if response.status_code == 202:
+                # Poll the background job until processing finishes
+                job_id = response.json()['job_id']
+                while True:
+                    response = requests.get(f"{BASE_URL}/jobs/{job_id}")
+                    job = response.json()
+                    if job['status'] in ('completed', 'failed'):
+                        break
+                    time.sleep(0.5)
+                for stage in job['stages']:
+                    print(f"   Stage {stage['name']}: {stage['elapsed']:.2f}s")
+                if job['status'] == 'failed':
+                    print(f"❌ PDF processing failed: {job['error']}")
+                    return False
+                
                 print("✅ PDF upload successful")
-                data = response.json()
+                data = job['result']
                 print(f"   Message: {data.get('message', '')}")
                 print(f"   Filename: {data.get('filename', '')}")
+                print(f"   Document ID: {data.get('document_id', '')}")
+                document_id = data.get('document_id')
                 print(f"   Pages: {data.get('pages', 0)}")
                 if data.get('summary'):
                     print(f"   Summary: {data.get('summary', '')[:100]}...")
@@ -80,6 +101,27 @@ def test_pdf_upload():
         print(f"❌ PDF upload error: {e}")
         return False
 
+def test_replace_unknown_document():
+    """Test that revising a document id the server does not know is rejected"""
+    print("\n🔍 Testing upload with an unknown replaces id...")
+    if not os.path.exists(TEST_PDF_PATH):
+        print(f"⚠️  Test PDF not found at {TEST_PDF_PATH}")
+        return False
+    try:
+        with open(TEST_PDF_PATH, 'rb') as pdf_file:
+            files = {'pdf': (TEST_PDF_PATH, pdf_file, 'application/pdf')}
+            response = requests.post(f"{BASE_URL}/upload", files=files, params={'wait': 1},
+                                     data={'replaces': '0' * 64})
+        error = response.json().get('error', '')
+        if response.status_code == 400 and error == 'Unknown document id to replace':
+            print("✅ Unknown replaces id rejected")
+            return True
+        print(f"❌ Unexpected response: {response.status_code} {error}")
+        return False
+    except requests.exceptions.ConnectionError:
+        print("❌ Cannot connect to backend")
+        return False
+
 def test_chat_functionality():
     """Test chat functionality"""
     print("\n🔍 Testing chat functionality...")
@@ -94,13 +136,15 @@ def test_chat_functionality():
         print(f"\n   Testing question: '{question}'")
         try:
             response = requests.post(f"{BASE_URL}/chat", 
-                                  json={'message': question},
+                                  json={'message': question, 'document_id': document_id},
                                   headers={'Content-Type': 'application/json'})
             
             if response.status_code == 200:
                 data = response.json()
                 print(f"   ✅ Response received")
                 print(f"      Answer: {data.get('response', '')[:100]}...")
+                pages = sorted({c.get('page') for c in data.get('citations', []) if c.get('page')})
+                print(f"      Cited pages: {pages}")
             else:
                 print(f"   ❌ Chat failed: {response.status_code}")
                 print(f"      Error: {response.json().get('error', 'Unknown error')}")
@@ -109,11 +153,109 @@ def test_chat_functionality():
     
     return True
 
+def test_chat_streaming():
+    """Test streamed chat answers and time to first token"""
+    print("\n🔍 Testing streaming chat...")
+    try:
+        start = time.time()
+        response = requests.post(f"{BASE_URL}/chat",
+                                 json={'message': 'What is this document about?',
+                                       'document_id': document_id, 'stream': True},
+                                 stream=True)
+        if response.status_code != 200:
+            print(f"❌ Streaming chat failed: {response.status_code}")
+            return False
+        
+        first_token_at = None
+        answer = ""
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith('data: '):
+                payload = json.loads(line[len('data: '):])
+                if 'token' in payload:
+                    if first_token_at is None:
+                        first_token_at = time.time() - start
+                    answer += payload['token']
+        
+        if first_token_at is None:
+            print("❌ No tokens received")
+            return False
+        print("✅ Streaming chat working")
+        print(f"   Time to first token: {first_token_at:.2f}s, total: {time.time() - start:.2f}s")
+        print(f"   Answer: {answer[:100]}...")
+        return True
+    except requests.exceptions.ConnectionError:
+        print("❌ Cannot connect to backend")
+        return False
+
+def test_chat_batch():
+    """Test answering several questions in one request"""
+    print("\n🔍 Testing batch chat...")
+    questions = ["What is this document about?", "List three key terms.", "What is this document about?"]
+    try:
+        start = time.time()
+        response = requests.post(f"{BASE_URL}/chat/batch",
+                                 json={'questions': questions, 'document_id': document_id})
+        if response.status_code != 200:
+            print(f"❌ Batch chat failed: {response.status_code}")
+            return False
+        data = response.json()
+        if [result['index'] for result in data.get('results', [])] != list(range(len(questions))):
+            print("❌ Batch results missing or out of order")
+            return False
+        print("✅ Batch chat working")
+        print(f"   {len(questions)} questions in {time.time() - start:.2f}s, stats: {data.get('stats')}")
+        return True
+    except requests.exceptions.ConnectionError:
+        print("❌ Cannot connect to backend")
+        return False
+
+def test_concurrent_chat():
+    """Test many simultaneous chat sessions; the server answers or sheds load with 429"""
+    print("\n🔍 Testing concurrent chat...")
+    
+    def ask(i):
+        response = requests.post(f"{BASE_URL}/chat",
+                                 json={'message': f'What is point {i} of this document?',
+                                       'document_id': document_id})
+        return response.status_code
+    
+    try:
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=50) as pool:
+            codes = list(pool.map(ask, range(50)))
+        unexpected = [code for code in codes if code not in (200, 429)]
+        if unexpected:
+            print(f"❌ Unexpected status codes: {unexpected}")
+            return False
+        print("✅ Concurrent chat working")
+        print(f"   {codes.count(200)} answered, {codes.count(429)} rejected as busy in {time.time() - start:.2f}s")
+        return True
+    except requests.exceptions.ConnectionError:
+        print("❌ Cannot connect to backend")
+        return False
+
+def test_metrics_endpoint():
+    """Test the Prometheus metrics endpoint after the chat tests have run"""
+    print("\n🔍 Testing metrics endpoint...")
+    try:
+        response = requests.get(f"{BASE_URL}/metrics")
+        if response.status_code != 200 or 'chatbot_stage_seconds' not in response.text:
+            print(f"❌ Metrics endpoint failed: {response.status_code}")
+            return False
+        stages = sorted({line.split('stage="')[1].split('"')[0]
+                         for line in response.text.splitlines() if line.startswith('chatbot_stage_seconds_count')})
+        print("✅ Metrics endpoint working")
+        print(f"   Timed stages: {', '.join(stages)}")
+        return True
+    except requests.exceptions.ConnectionError:
+        print("❌ Cannot connect to backend")
+        return False
+
 def test_summary_endpoint():
     """Test the summary endpoint"""
     print("\n🔍 Testing summary endpoint...")
     try:
-        response = requests.get(f"{BASE_URL}/summary")
+        response = requests.get(f"{BASE_URL}/summary", params={'document_id': document_id})
         if response.status_code == 200:
             print("✅ Summary endpoint working")
             data = response.json()
@@ -138,7 +280,12 @@ def run_all_tests():
         ("Health Check", test_health_endpoint),
         ("Status Endpoint", test_status_endpoint),
         ("PDF Upload", test_pdf_upload),
+        ("Replace Unknown Document", test_replace_unknown_document),
         ("Chat Functionality", test_chat_functionality),
+        ("Streaming Chat", test_chat_streaming),
+        ("Batch Chat", test_chat_batch),
+        ("Concurrent Chat", test_concurrent_chat),
+        ("Metrics Endpoint", test_metrics_endpoint),
         ("Summary Endpoint", test_summary_endpoint)
     ]
     
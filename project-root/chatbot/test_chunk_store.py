@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Offline tests for ChunkStore byte spans
+Builds stores from short multi-page texts in a temporary directory; no server or model needed.
+
+    python test_chunk_store.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from chunk_store import ChunkStore, ChunkStoreBuilder
+
+# Non-ASCII text makes byte offsets and character offsets differ
+PAGES = [
+    (1, 'Café au lait. Crème brûlée.\n\n'),
+    (2, 'Plain ASCII page about sorting.\n\n'),
+    (3, 'Ünïcode façade, naïve résumé.\n\n'),
+]
+
+
+def build():
+    """A store with two overlapping chunks per page, and the chunks it was built from"""
+    builder = ChunkStoreBuilder()
+    chunks = []
+    for page_num, block in PAGES:
+        builder.add_page(page_num, block)
+        text = block.strip()
+        for chunk in (text[:len(text) // 2 + 3], text[len(text) // 2:]):
+            builder.add_chunk(chunk)
+            chunks.append(chunk)
+    return builder.build([len(chunk.split()) for chunk in chunks]), chunks
+
+
+def test_chunks_decode_to_the_text_they_were_built_from():
+    """Every span decodes to its chunk, and the buffer holds each page block once"""
+    store, chunks = build()
+    assert list(store) == chunks
+    assert store[1:3] == chunks[1:3]
+    assert store.text == ''.join(block for _page, block in PAGES)
+
+
+def test_locations_are_character_offsets_into_the_text():
+    """location() gives each chunk's page and its character span in the document text"""
+    store, chunks = build()
+    text = store.text
+    for i, chunk in enumerate(chunks):
+        page, start, end = store.location(i)
+        assert text[start:end] == chunk
+        assert page == i // 2 + 1
+        assert store.tokens(i) == len(chunk.split())
+
+
+def test_chunk_not_in_page_is_rejected():
+    """Chunks must be exact slices of their page block"""
+    builder = ChunkStoreBuilder()
+    builder.add_page(1, 'only this text\n\n')
+    try:
+        builder.add_chunk('something else')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expected ValueError')
+
+
+def check_round_trip(memory_map):
+    store, chunks = build()
+    root = tempfile.mkdtemp()
+    try:
+        text_path, spans_path = os.path.join(root, 'text.txt'), os.path.join(root, 'spans.bin')
+        with open(text_path, 'wb') as f:
+            f.write(store.to_bytes())
+        store.save_spans(spans_path)
+        loaded = ChunkStore.load(text_path, spans_path, memory_map=memory_map)
+        assert loaded.memory_mapped == memory_map
+        assert list(loaded) == chunks
+        assert [loaded.span(i) for i in range(len(loaded))] == [store.span(i) for i in range(len(store))]
+        del loaded
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def test_spans_round_trip_through_files():
+    """Saved text and spans load back into the same chunks, read into memory"""
+    check_round_trip(memory_map=False)
+
+
+def test_spans_round_trip_through_memory_map():
+    """The same, with the text served from a memory map of its file"""
+    check_round_trip(memory_map=True)
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
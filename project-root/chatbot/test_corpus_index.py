@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the persistent corpus index
+Indexes random vectors in a temporary directory; no server or model needed.
+
+    python test_corpus_index.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from corpus_index import CorpusIndex
+
+DIMENSION = 32
+
+
+def document_id(n):
+    return f'{n:064x}'
+
+
+def with_corpus(mode):
+    """Run the test against an empty corpus of the given index mode"""
+    def decorate(test):
+        def run():
+            root = tempfile.mkdtemp()
+            try:
+                test(CorpusIndex(root=root, precision='float32', mode=mode))
+            finally:
+                shutil.rmtree(root, ignore_errors=True)
+        run.__name__ = test.__name__
+        run.__doc__ = test.__doc__
+        return run
+    return decorate
+
+
+def add_library(corpus, large_documents=5, large_chunks=200):
+    """Several large documents about one topic and one small document; returns the small one's id"""
+    rng = np.random.default_rng(0)
+    for n in range(large_documents):
+        chunks = [f'alpha beta report {n} section {i}' for i in range(large_chunks)]
+        corpus.add_document(document_id(n), f'large-{n}.pdf', chunks,
+                            rng.random((large_chunks, DIMENSION), dtype='float32'))
+    small = document_id(large_documents)
+    corpus.add_document(small, 'small.pdf', ['alpha gamma notes', 'delta epsilon notes'],
+                        rng.random((2, DIMENSION), dtype='float32') + 10)
+    return small
+
+
+def check_filtered_search(corpus):
+    small = add_library(corpus)
+    # The query is nearest to the large documents, so the small one is far down the global ranking
+    query = np.full(DIMENSION, 0.5, dtype='float32')
+    hits = corpus.search_by_vector(query, k=3, document_ids={small})
+    assert [doc.metadata['chunk'] for doc, _distance in hits] in ([0, 1], [1, 0])
+    assert all(doc.metadata['document_id'] == small for doc, _distance in hits)
+    assert len(corpus.search_by_vector(query, k=3)) == 3
+
+    hits = corpus.search_text('alpha', k=3, document_ids={small})
+    assert [doc.page_content for doc, _score in hits] == ['alpha gamma notes']
+    assert corpus.search_by_vector(query, k=3, document_ids={document_id(99)}) == []
+
+
+@with_corpus('flat')
+def test_filtered_search_finds_small_document_flat(corpus):
+    """A filtered search returns the chosen document's chunks however many closer chunks other documents have"""
+    check_filtered_search(corpus)
+    assert corpus.stats()['mode'] == 'flat'
+
+
+@with_corpus('ivf')
+def test_filtered_search_finds_small_document_ivf(corpus):
+    """The same holds when the corpus is an IVF index, whose lists are searched in full"""
+    check_filtered_search(corpus)
+    assert corpus.stats()['mode'] == 'ivf'
+
+
+@with_corpus('flat')
+def test_add_and_remove_document(corpus):
+    """Removing a document drops its vectors, rows and full-text entries and leaves the others"""
+    small = add_library(corpus, large_documents=2, large_chunks=10)
+    assert corpus.stats()['vectors'] == 22 and corpus.contains(small)
+    assert corpus.remove_document(small) == 2
+    assert not corpus.contains(small) and corpus.remove_document(small) == 0
+    assert corpus.stats()['vectors'] == 20
+    assert [doc['document_id'] for doc in corpus.documents()] == [document_id(0), document_id(1)]
+    assert corpus.search_text('gamma', k=3) == []
+    query = np.full(DIMENSION, 10.5, dtype='float32')
+    assert all(doc.metadata['document_id'] != small for doc, _distance in corpus.search_by_vector(query, k=5))
+
+
+@with_corpus('flat')
+def test_replacing_a_document_swaps_its_chunks(corpus):
+    """add_document with replaces removes the old version in the same step"""
+    corpus.add_document(document_id(0), 'notes.pdf', ['old text'], np.zeros((1, DIMENSION), dtype='float32'),
+                        chunk_locations=[(1, 0, 8)])
+    corpus.add_document(document_id(1), 'notes.pdf', ['new text'], np.ones((1, DIMENSION), dtype='float32'),
+                        replaces=document_id(0), chunk_locations=[(1, 0, 8)])
+    assert [doc['document_id'] for doc in corpus.documents()] == [document_id(1)]
+    assert corpus.stats()['vectors'] == 1
+    hits = corpus.search_text('text', k=3)
+    assert [(doc.page_content, doc.metadata['page']) for doc, _score in hits] == [('new text', 1)]
+
+
+@with_corpus('flat')
+def test_reopened_corpus_serves_the_saved_index(corpus):
+    """A second instance on the same directory, like a restart or another worker, sees the same chunks"""
+    add_library(corpus, large_documents=1, large_chunks=10)
+    reopened = CorpusIndex(root=corpus.root, precision='float32', mode='flat')
+    assert reopened.stats()['vectors'] == 12
+    query = np.full(DIMENSION, 10.5, dtype='float32')
+    assert reopened.search_by_vector(query, k=1)[0][0].metadata['filename'] == 'small.pdf'
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the on-disk document cache's size limit
+Writes entries of random vectors to a temporary directory; no server or model needed.
+
+    python test_document_cache.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from chunk_store import ChunkStoreBuilder
+from document_cache import DocumentCache
+
+
+def make_entry(text, dimension=64, rows=64):
+    """A ChunkStore of one chunk per page and a vector store of random vectors"""
+    builder = ChunkStoreBuilder()
+    builder.add_page(1, text)
+    builder.add_chunk(text)
+    index = faiss.IndexFlatL2(dimension)
+    index.add(np.random.rand(rows, dimension).astype('float32'))
+    return builder.build(), SimpleNamespace(index=index)
+
+
+def with_cache(test):
+    def run():
+        root = tempfile.mkdtemp()
+        try:
+            test(root)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    run.__name__ = test.__name__
+    run.__doc__ = test.__doc__
+    return run
+
+
+@with_cache
+def test_cache_stays_under_max_bytes(root):
+    """Least recently used entries are evicted, and reported, once the cache outgrows max_bytes"""
+    evicted = []
+    cache = DocumentCache(root, max_bytes=64 * 1024, memory_map=False, on_evict=evicted.append)
+    keys = [f'{i:064x}' for i in range(8)]
+    for i, key in enumerate(keys):
+        chunks, store = make_entry(f'document {i} ' * 100)
+        assert cache.put(key, chunks, store, meta={'filename': f'{i}.pdf'})
+        # Entries are ordered by mtime; keep them apart on coarse clocks
+        os.utime(os.path.join(root, key), (time.time() + i, time.time() + i))
+        assert sum(size for _mtime, size, _key in cache.entries()) <= cache.max_bytes
+    assert evicted and evicted == keys[:len(evicted)]
+    assert all(not cache.contains(key) for key in evicted)
+    assert cache.contains(keys[-1])
+
+
+@with_cache
+def test_used_entry_outlives_older_ones(root):
+    """Touching an entry moves it to the back of the eviction order"""
+    evicted = []
+    cache = DocumentCache(root, max_bytes=40 * 1024, memory_map=False, on_evict=evicted.append)
+    first, second, third = (f'{i:064x}' for i in range(3))
+    for i, key in enumerate((first, second)):
+        chunks, store = make_entry(f'document {i} ' * 100)
+        cache.put(key, chunks, store)
+        os.utime(os.path.join(root, key), (time.time() - 10 + i, time.time() - 10 + i))
+    cache.touch(first)
+    chunks, store = make_entry('document 2 ' * 100)
+    cache.put(third, chunks, store)
+    assert evicted == [second]
+    assert cache.contains(first) and cache.contains(third)
+
+
+@with_cache
+def test_new_entry_larger_than_the_cache_is_kept(root):
+    """The entry just written is never the one evicted, even when it alone exceeds max_bytes"""
+    evicted = []
+    cache = DocumentCache(root, max_bytes=1024, memory_map=False, on_evict=evicted.append)
+    first, second = f'{0:064x}', f'{1:064x}'
+    for key in (first, second):
+        chunks, store = make_entry('document ' * 100)
+        cache.put(key, chunks, store)
+    assert evicted == [first]
+    assert cache.contains(second) and cache.stats()['entries'] == 1
+
+
+@with_cache
+def test_running_size_matches_disk(root):
+    """The size kept up to date by put, remove and evict equals a walk of the cache directory"""
+    cache = DocumentCache(root, max_bytes=40 * 1024, memory_map=False)
+    keys = [f'{i:064x}' for i in range(4)]
+    for i, key in enumerate(keys):
+        chunks, store = make_entry(f'document {i} ' * 100)
+        cache.put(key, chunks, store)
+        assert cache.total_bytes == sum(size for _mtime, size, _key in cache.entries())
+    cache.remove(keys[-1])
+    on_disk = cache.entries()
+    assert cache.total_bytes == sum(size for _mtime, size, _key in on_disk)
+    assert cache.stats()['entries'] == len(on_disk)
+    # A new instance, as after a restart, starts from the same total
+    assert DocumentCache(root, memory_map=False).total_bytes == cache.total_bytes
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Offline tests for BM25 ranking and reciprocal rank fusion
+Runs on short in-memory texts; no server or model needed.
+
+    python test_lexical_index.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from langchain.docstore.document import Document
+
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+CHUNKS = [
+    'The mitochondria is the powerhouse of the cell.',
+    'Photosynthesis converts light into chemical energy in the chloroplast.',
+    'Course CS-101 covers sorting algorithms and their running time.',
+    'Mitochondria mitochondria mitochondria: a chunk that repeats one term.',
+    'Sorting is also discussed in the appendix.',
+]
+
+
+def test_tokenize_drops_stopwords_and_splits_compounds():
+    """Question words are dropped; 'cs-101' is kept whole and as its parts"""
+    assert tokenize('What is CS-101 about?') == ['cs-101', 'cs', '101']
+
+
+def test_bm25_ranks_matching_chunks_only():
+    """Only chunks containing a query term are returned, best match first"""
+    index = BM25Index(CHUNKS)
+    results = index.search('mitochondria', k=5)
+    assert [position for position, _score in results] == [3, 0]
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_bm25_prefers_rare_terms():
+    """A chunk matching a rare term outranks one matching only a common term"""
+    index = BM25Index(CHUNKS + ['Sorting sorting, nothing else.'])
+    results = index.search('sorting algorithms', k=2)
+    assert results[0][0] == 2
+
+
+def test_bm25_limits_results_to_k():
+    """At most k chunks come back, and none when no term matches"""
+    index = BM25Index(CHUNKS)
+    assert len(index.search('mitochondria sorting photosynthesis', k=2)) == 2
+    assert index.search('unrelated words', k=3) == []
+
+
+def chunk(text, document_id='doc'):
+    return Document(page_content=text, metadata={'document_id': document_id})
+
+
+def test_rrf_rewards_chunks_in_both_rankings():
+    """A chunk ranked second in both lists beats chunks ranked first in only one"""
+    a, b, c = chunk('a'), chunk('b'), chunk('c')
+    fused = reciprocal_rank_fusion([[a, b], [c, b]], k=3)
+    assert [doc.page_content for doc in fused] == ['b', 'a', 'c']
+
+
+def test_rrf_keeps_same_text_of_different_documents_apart():
+    """Chunks are identified by document and text, so equal text in two documents stays two results"""
+    fused = reciprocal_rank_fusion([[chunk('same', 'one')], [chunk('same', 'two')]], k=5)
+    assert sorted(doc.metadata['document_id'] for doc in fused) == ['one', 'two']
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the LLM gateway's hedging and retries
+Drives LLMGateway with the in-process FakeBackend; no server or API key needed.
+
+    python test_llm_gateway.py
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import wait
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+import llm_gateway
+from llm_gateway import FakeBackend, LLMError, LLMGateway
+
+
+class ScriptedBackend(FakeBackend):
+    """FakeBackend whose n-th call (from 1) sleeps or fails as scripted"""
+
+    def __init__(self, delays=None, failures=None):
+        super().__init__(first_token_delay=0, token_delay=0)
+        self.delays = delays or {}
+        # call number -> HTTP status of the error it raises
+        self.failures = failures or {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, prompt, model, max_tokens, temperature):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        time.sleep(self.delays.get(call, 0))
+        if call in self.failures:
+            error = Exception(f"scripted failure of call {call}")
+            error.http_status = self.failures[call]
+            raise error
+        return super().complete(prompt, model, max_tokens, temperature)
+
+
+def test_slow_primary_is_hedged():
+    """A primary slower than hedge_after loses to the hedged copy"""
+    gateway = LLMGateway(ScriptedBackend(delays={1: 2.0}), hedge_after=0.05)
+    start = time.perf_counter()
+    assert gateway.complete('hello there', 20, 0.3)
+    assert time.perf_counter() - start < 1.0
+    stats = gateway.stats()
+    assert stats['hedges'] == 1 and stats['hedge_wins'] == 1
+
+
+def settled_wait(futures, timeout=None, return_when=None):
+    """concurrent.futures.wait that lets the other copy finish too, and lists failures first"""
+    done, pending = wait(futures, timeout=timeout, return_when=return_when)
+    if done and pending:
+        time.sleep(0.2)
+        done, pending = wait(futures, timeout=0)
+    return sorted(done, key=lambda future: future.exception() is None), pending
+
+
+def test_failed_primary_does_not_discard_hedge():
+    """Without retries, a primary that fails in the same wait as a successful hedge still yields the hedge's reply"""
+    backend = ScriptedBackend(delays={1: 0.2, 2: 0.1}, failures={1: 503})
+    gateway = LLMGateway(backend, hedge_after=0.05, max_retries=0)
+    original_wait, llm_gateway.wait = llm_gateway.wait, settled_wait
+    try:
+        assert gateway.complete('hello there', 20, 0.3)
+    finally:
+        llm_gateway.wait = original_wait
+    assert gateway.stats()['hedge_wins'] == 1
+
+
+def test_retryable_failure_is_retried():
+    """A 503 is retried and the second attempt's reply returned"""
+    gateway = LLMGateway(ScriptedBackend(failures={1: 503}), retry_base_delay=0.01)
+    assert gateway.complete('hello there', 20, 0.3)
+    stats = gateway.stats()
+    assert stats['retries'] == 1 and stats['failures'] == 0
+
+
+def test_client_error_is_not_retried():
+    """A 400 fails at once"""
+    backend = ScriptedBackend(failures={1: 400})
+    gateway = LLMGateway(backend, retry_base_delay=0.01)
+    try:
+        gateway.complete('hello there', 20, 0.3)
+    except LLMError:
+        pass
+    else:
+        raise AssertionError('expected LLMError')
+    assert backend.calls == 1 and gateway.stats()['retries'] == 0
+
+
+if __name__ == '__main__':
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)